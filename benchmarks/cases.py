@@ -0,0 +1,167 @@
+import random
+from types import SimpleNamespace
+from bot.database.core import engine, Base, async_session_maker, sync_schema
+from bot.database.models import GroupSettings
+from bot.services.moderator import ModerationService
+from bot.services.pipeline import MessageContext, get_pipeline
+from bot.services.repository import Repository
+from bot.services.settings_cache import settings_cache
+from bot.services.log_sink import log_sink
+from bot.locales.i18n import LocalizationService
+
+GROUP_ID = -1000000000001
+
+# Mixed Uzbek (Latin + Cyrillic), Russian and English chat traffic
+MESSAGES = [
+    "Assalomu alaykum, hammaga xayrli kun!",
+    "Бугун учрашув соат нечада бўлади?",
+    "Привет всем, кто знает где купить билеты?",
+    "ok",
+    "Rahmat, tushundim 👍",
+    "Kecha yuborgan faylni qayta tashlab bering iltimos, telefonimda ochilmadi",
+    "Кто-нибудь пробовал новый тариф? Стоит переходить или нет, подскажите пожалуйста",
+    "Check this out https://example.com/promo",
+    "Join our channel t.me/some_channel for free signals!!!",
+    "Men ham shu savolni bermoqchi edim, javob bo'lsa yozib qo'yinglar",
+    "ЗАРАБОТОК БЕЗ ВЛОЖЕНИЙ, пиши в лс",
+    "Bugun havo juda issiq bo'ladi deyishyapti, ehtiyot bo'linglar",
+]
+
+SYLLABLES = ["ka", "zi", "no", "pul", "tez", "yut", "sex", "bet", "lo", "to", "rey", "mak", "xo", "ja", "qo", "shi"]
+
+def forbidden_words(count: int, seed: int = 42):
+    rnd = random.Random(seed)
+    words = {"казино", "casino", "ставки", "заработок", "jo'ja", "ahmoq"}
+    while len(words) < count:
+        words.add("".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(words)
+
+def make_settings(group_id: int, words=None) -> GroupSettings:
+    """Transient settings object with the model defaults filled in"""
+    return GroupSettings(
+        group_id=group_id, language='uz',
+        delete_links=True, delete_forwards=True, delete_mentions=False,
+        forbidden_words=words or [], forbidden_words_whole_word=False,
+        allow_photos=True, allow_videos=True, allow_stickers=True, allow_gifs=True,
+        anti_spam_enabled=True, flood_threshold=5, flood_period=5, duplicate_detection=False,
+        captcha_enabled=False, captcha_type='button', captcha_timeout=60, captcha_fail_action='kick',
+        new_user_read_only=False, read_only_duration=300, silent_mode=False,
+        raid_protection_enabled=True, raid_join_threshold=15, raid_join_window=60, raid_lockdown_minutes=30,
+        warn_limit=3, warn_action='mute', mute_duration=60,
+    )
+
+async def moderation_cases(bench, args):
+    messages = MESSAGES
+    link_entities = [SimpleNamespace(type='url')]
+
+    for label, words in (("no words", []), ("20 words", forbidden_words(20)), ("300 words", forbidden_words(300))):
+        group_id = GROUP_ID - len(words)
+        settings = make_settings(group_id, words)
+        # Same as production: settings come from the cache, so the matcher is cached too
+        settings_cache.set(group_id, settings)
+
+        async def check(i, settings=settings):
+            ModerationService.check_message(text=messages[i % len(messages)], settings=settings)
+        await bench.run(f"moderation.check_message[{label}]", check)
+
+    settings = make_settings(GROUP_ID)
+    async def check_entities(i):
+        ModerationService.check_message(text=messages[i % len(messages)], settings=settings, entities=link_entities)
+    await bench.run("moderation.check_message[url entity]", check_entities)
+
+    # Full per-group chain as run by handle_group_message (flood window included)
+    words = forbidden_words(20)
+    settings_words = make_settings(GROUP_ID - 1000, words)
+    settings_words.duplicate_detection = True
+    settings_cache.set(settings_words.group_id, settings_words)
+    async def pipeline(i):
+        ctx = MessageContext(messages[i % len(messages)])
+        await get_pipeline(settings_words).run(ctx, settings_words.group_id, i % 500)
+    await bench.run("moderation.pipeline[20 words, duplicates]", pipeline)
+
+    idle = make_settings(GROUP_ID - 2000)
+    idle.delete_links = idle.delete_forwards = idle.anti_spam_enabled = False
+    settings_cache.set(idle.group_id, idle)
+    async def pipeline_idle(i):
+        get_pipeline(idle).empty
+    await bench.run("moderation.pipeline[nothing enabled]", pipeline_idle)
+
+    no_media = make_settings(GROUP_ID - 3000)
+    no_media.allow_photos = no_media.allow_stickers = False
+    settings_cache.set(no_media.group_id, no_media)
+    content_types = ('text', 'photo', 'sticker', 'video')
+    async def media(i):
+        get_pipeline(no_media).media_blocked(content_types[i % len(content_types)])
+    await bench.run("moderation.pipeline[media filter]", media)
+
+    async def flood(i):
+        await ModerationService.is_flood(i % 500, GROUP_ID, settings)
+    await bench.run("moderation.is_flood[500 users]", flood)
+
+async def i18n_cases(bench, args):
+    async def plain(i):
+        LocalizationService.get('uz' if i % 2 else 'ru', 'link_detected')
+    await bench.run("i18n.get[plain]", plain)
+
+    async def formatted(i):
+        LocalizationService.get('uz', 'warn_user', user="<a href='tg://user?id=1'>User</a>", reason="Spam", count=1, limit=3)
+    await bench.run("i18n.get[format]", formatted)
+
+async def repository_cases(bench, args):
+    n = args.db_iterations
+
+    async def settings_cached(i):
+        async with async_session_maker() as session:
+            await Repository(session).get_group_settings(GROUP_ID)
+    await bench.run("repo.get_group_settings[cached]", settings_cached, n)
+
+    async def settings_uncached(i):
+        settings_cache.invalidate(GROUP_ID)
+        async with async_session_maker() as session:
+            await Repository(session).get_group_settings(GROUP_ID)
+    await bench.run("repo.get_group_settings[uncached]", settings_uncached, n)
+
+    async def upsert_user(i):
+        async with async_session_maker() as session:
+            await Repository(session).upsert_user(i % 100, username=f"user{i % 100}", full_name="Bench User")
+    await bench.run("repo.upsert_user", upsert_user, n)
+
+    async def add_warn(i):
+        async with async_session_maker() as session:
+            await Repository(session).add_warn(GROUP_ID, i % 100, "bench")
+    await bench.run("repo.add_warn", add_warn, n)
+
+    async def log_action_direct(i):
+        async with async_session_maker() as session:
+            await Repository(session).log_action(GROUP_ID, i % 100, 'delete', 'bench')
+    await bench.run("repo.log_action[direct]", log_action_direct, n)
+
+    log_sink.start()
+    try:
+        async def log_action_queued(i):
+            async with async_session_maker() as session:
+                await Repository(session).log_action(GROUP_ID, i % 100, 'delete', 'bench')
+        await bench.run("repo.log_action[queued]", log_action_queued, n)
+    finally:
+        await log_sink.stop()
+
+async def run_all(bench, args):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(sync_schema)
+
+    class Filtered:
+        """Skips cases not matching --only"""
+        def __getattr__(self, name):
+            return getattr(bench, name)
+
+        async def run(self, name, func, iterations=None):
+            if args.only and args.only not in name:
+                return
+            await bench.run(name, func, iterations)
+
+    try:
+        for cases in (moderation_cases, i18n_cases, repository_cases):
+            await cases(Filtered(), args)
+    finally:
+        await engine.dispose()
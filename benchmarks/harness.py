@@ -0,0 +1,121 @@
+import gc
+import json
+import time
+import platform
+import tracemalloc
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def summarize(samples_ns: List[int]) -> Dict[str, float]:
+    """Latency percentiles in microseconds"""
+    values = sorted(s / 1000 for s in samples_ns)
+    return {
+        "n": len(values),
+        "mean_us": round(sum(values) / len(values), 3),
+        "p50_us": round(percentile(values, 50), 3),
+        "p90_us": round(percentile(values, 90), 3),
+        "p99_us": round(percentile(values, 99), 3),
+        "max_us": round(values[-1], 3),
+    }
+
+class Bench:
+    """
+    Collects latency and allocation numbers for named operations.
+
+    Every case runs `warmup` untimed calls, `iterations` timed calls and then
+    `alloc_iterations` calls under tracemalloc (kept separate so tracing does
+    not distort the latency numbers).
+    """
+
+    def __init__(self, iterations: int = 2000, warmup: int = 100, alloc_iterations: int = 200):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.alloc_iterations = alloc_iterations
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    async def run(self, name: str, func: Callable[[int], Awaitable], iterations: Optional[int] = None):
+        """`func(i)` is awaited once per iteration"""
+        iterations = iterations or self.iterations
+        for i in range(self.warmup):
+            await func(i)
+
+        samples = []
+        gc.collect()
+        gc.disable()
+        try:
+            for i in range(iterations):
+                start = time.perf_counter_ns()
+                await func(self.warmup + i)
+                samples.append(time.perf_counter_ns() - start)
+        finally:
+            gc.enable()
+
+        stats = summarize(samples)
+        stats.update(await self._allocations(func, self.warmup + iterations))
+        self.results[name] = stats
+        print(
+            f"{name:<45} p50 {stats['p50_us']:>10.1f}us  p99 {stats['p99_us']:>10.1f}us  "
+            f"alloc {stats['alloc_bytes']:>9.0f}B  retained {stats['retained_bytes']:>8.0f}B"
+        )
+
+    async def _allocations(self, func: Callable[[int], Awaitable], offset: int) -> Dict[str, float]:
+        tracemalloc.start()
+        peak_total = 0
+        retained_total = 0
+        try:
+            for i in range(self.alloc_iterations):
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await func(offset + i)
+                after, peak = tracemalloc.get_traced_memory()
+                peak_total += max(0, peak - before)
+                retained_total += after - before
+        finally:
+            tracemalloc.stop()
+        return {
+            # Peak extra memory allocated during one call
+            "alloc_bytes": round(peak_total / self.alloc_iterations, 1),
+            # Memory still held after the call (caches, buffers, leaks)
+            "retained_bytes": round(retained_total / self.alloc_iterations, 1),
+        }
+
+    def to_json(self, label: str, database_url: str) -> dict:
+        return {
+            "label": label,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "database": database_url.split("://")[0],
+            "results": self.results,
+        }
+
+def save(path: str, payload: dict):
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    print(f"Saved baseline to {path}")
+
+def compare(baseline_path: str, current: dict, threshold: float, metric: str = "p50_us") -> bool:
+    """Print the diff against a saved baseline. Returns False on any regression above `threshold`."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    ok = True
+    print(f"\nCompared with {baseline_path} ({baseline.get('label')}), metric {metric}, threshold {threshold:.0%}")
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old or not old.get(metric):
+            print(f"  {name:<45} new")
+            continue
+        change = stats[metric] / old[metric] - 1
+        marker = ""
+        if change > threshold:
+            marker = "  REGRESSION"
+            ok = False
+        print(f"  {name:<45} {old[metric]:>10.1f} -> {stats[metric]:>10.1f}us ({change:+.1%}){marker}")
+    return ok
@@ -0,0 +1,71 @@
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+from starlette.requests import Request
+from starlette.responses import Response
+from config import API_CACHE_TTL, API_CACHE_SIZE
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, W/ prefixes are ignored"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(","))
+
+class ResponseCache:
+    """
+    Short-lived LRU/TTL cache of serialized API responses as (etag, body).
+    Writes through the API invalidate their keys right away, the TTL only
+    bounds how stale data changed elsewhere can get (member counts, groups
+    added by the bot).
+    """
+
+    def __init__(self, max_size: int = API_CACHE_SIZE, ttl: float = API_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (expires_at, etag, body)
+        self._entries: "OrderedDict[Hashable, Tuple[float, str, bytes]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, bytes]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, etag, body = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return etag, body
+
+    def set(self, key: Hashable, body: bytes, etag: str = None) -> Tuple[str, bytes]:
+        """Store a serialized response, the ETag defaults to a hash of the body"""
+        etag = etag or make_etag(body)
+        self._entries[key] = (time.monotonic() + self.ttl, etag, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+response_cache = ResponseCache()
+
+def cached_response(request: Request, etag: str, body: bytes) -> Response:
+    """JSON body, or 304 when the client already has this ETag. Clients always revalidate."""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,10 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException
+import hmac
+import orjson
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Depends, HTTPException, Request, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 from bot.database.core import async_session_maker
-from bot.database.models import GroupSettings, Group
+from bot.database.models import GroupSettings, Group, SettingsTemplate
 from bot.services.repository import Repository
+from bot.services.settings_cache import settings_cache
+from bot.services.webhook import update_feeder
+from bot.services.metrics import registry
+from bot.api.cache import response_cache, cached_response
+from config import WEBHOOK_PATH, WEBHOOK_SECRET
 from typing import List, Optional
 
 app = FastAPI()
@@ -27,6 +35,8 @@ class SettingsUpdate(BaseModel):
     deleteLinks: Optional[bool] = None
     deleteMentions: Optional[bool] = None
     deleteForwarded: Optional[bool] = None
+    forbiddenWords: Optional[List[str]] = None
+    forbiddenWordsWholeWord: Optional[bool] = None
     allowPhotos: Optional[bool] = None
     allowVideos: Optional[bool] = None
     allowStickers: Optional[bool] = None
@@ -48,27 +58,89 @@ class SettingsUpdate(BaseModel):
     newUserReadOnly: Optional[bool] = None
     readOnlyDurationSeconds: Optional[int] = None
     
+    raidProtectionEnabled: Optional[bool] = None
+    raidJoinThreshold: Optional[int] = None
+    raidJoinWindowSeconds: Optional[int] = None
+    raidLockdownMinutes: Optional[int] = None
+    
     silentMode: Optional[bool] = None
     botLanguage: Optional[str] = None
 
+def _clean_words(words: List[str]) -> List[str]:
+    return [w.strip() for w in words if w.strip()]
+
+# SettingsUpdate field -> (GroupSettings column, normalizer). warnSystemEnabled is not stored.
+SETTINGS_COLUMNS = {
+    "deleteLinks": ("delete_links", None),
+    "deleteMentions": ("delete_mentions", None),
+    "deleteForwarded": ("delete_forwards", None),
+    "forbiddenWords": ("forbidden_words", _clean_words),
+    "forbiddenWordsWholeWord": ("forbidden_words_whole_word", None),
+    
+    "allowPhotos": ("allow_photos", None),
+    "allowVideos": ("allow_videos", None),
+    "allowStickers": ("allow_stickers", None),
+    "allowGifs": ("allow_gifs", None),
+    
+    "floodControlEnabled": ("anti_spam_enabled", None),
+    "floodMessagesLimit": ("flood_threshold", None),
+    "floodIntervalSeconds": ("flood_period", None),
+    "duplicateDetection": ("duplicate_detection", None),
+    
+    "warnLimit": ("warn_limit", None),
+    
+    "captchaEnabled": ("captcha_enabled", None),
+    "captchaType": ("captcha_type", None),
+    "captchaTimeoutSeconds": ("captcha_timeout", None),
+    "captchaFailAction": ("captcha_fail_action", None),
+    
+    "newUserReadOnly": ("new_user_read_only", None),
+    "readOnlyDurationSeconds": ("read_only_duration", None),
+    
+    "raidProtectionEnabled": ("raid_protection_enabled", None),
+    "raidJoinThreshold": ("raid_join_threshold", lambda v: max(2, v)),
+    "raidJoinWindowSeconds": ("raid_join_window", lambda v: max(1, v)),
+    "raidLockdownMinutes": ("raid_lockdown_minutes", lambda v: max(1, v)),
+    
+    "silentMode": ("silent_mode", None),
+    "botLanguage": ("language", None),
+}
+
+def settings_values(data: SettingsUpdate) -> dict:
+    """GroupSettings column -> value for the fields set in `data`"""
+    values = {}
+    for field, value in data.model_dump(exclude_none=True).items():
+        if field not in SETTINGS_COLUMNS:
+            continue
+        column, normalize = SETTINGS_COLUMNS[field]
+        values[column] = normalize(value) if normalize else value
+    return values
+
+# Cached settings responses follow the settings cache (API writes and bot side invalidations)
+settings_cache.listeners.append(lambda group_id: response_cache.invalidate(('settings', group_id)))
+
 @app.get("/api/groups")
-async def get_groups(userId: int, db: AsyncSession = Depends(get_db)):
-    repo = Repository(db)
-    groups = await repo.get_groups_by_owner(userId)
-    return [
-        {
-            "id": str(g.id),
-            "telegramId": g.id,
-            "title": g.title,
-            "username": None, # Not tracking username currently
-            "memberCount": 0, # Not tracking currently
-            "isBound": True,
-            "isPremium": g.is_premium,
-            "adsExempt": g.is_premium,
-            "createdAt": g.created_at.isoformat() if g.created_at else None
-        }
-        for g in groups
-    ]
+async def get_groups(userId: int, request: Request, db: AsyncSession = Depends(get_db)):
+    key = ('groups', userId)
+    cached = response_cache.get(key)
+    if cached is None:
+        repo = Repository(db)
+        groups = await repo.get_groups_by_owner(userId)
+        cached = response_cache.set(key, orjson.dumps([group_payload(g) for g in groups]))
+    return cached_response(request, *cached)
+
+def group_payload(g: Group) -> dict:
+    return {
+        "id": str(g.id),
+        "telegramId": g.id,
+        "title": g.title,
+        "username": None, # Not tracking username currently
+        "memberCount": g.member_count or 0, # Cached, see bot.services.member_counts
+        "isBound": True,
+        "isPremium": g.is_premium,
+        "adsExempt": g.is_premium,
+        "createdAt": g.created_at.isoformat() if g.created_at else None
+    }
 
 class GroupCreate(BaseModel):
     groupId: int
@@ -91,6 +163,7 @@ async def create_group(data: GroupCreate, db: AsyncSession = Depends(get_db)):
         title=data.title,
         owner_id=data.ownerId
     )
+    response_cache.invalidate(('groups', data.ownerId))
     
     return {
         "status": "created",
@@ -101,19 +174,58 @@ async def create_group(data: GroupCreate, db: AsyncSession = Depends(get_db)):
         }
     }
 
-@app.get("/api/groups/{group_id}/settings")
-async def get_settings(group_id: int, db: AsyncSession = Depends(get_db)):
+@app.get("/api/groups/{group_id}/stats")
+async def get_stats(group_id: int, days: int = 30, db: AsyncSession = Depends(get_db)):
+    """Dashboard data from cached counters only, no Telegram calls and no log scans"""
+    group = await db.get(Group, group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+
+    days = max(1, min(days, 365))
+    since = datetime.utcnow().date() - timedelta(days=days - 1) # rollup days are UTC
     repo = Repository(db)
-    settings = await repo.get_group_settings(group_id)
-    if not settings:
-        raise HTTPException(status_code=404, detail="Settings not found")
-        
+    rows = await repo.get_daily_stats(group_id, since)
+    warned_users = await repo.count_warned_users(group_id)
+
+    totals = {}
+    daily = {}
+    for row in rows:
+        totals[row.action] = totals.get(row.action, 0) + row.count
+        daily.setdefault(row.day.isoformat(), {})[row.action] = row.count
+
+    return {
+        "groupId": str(group_id),
+        "memberCount": group.member_count or 0,
+        "memberCountUpdatedAt": group.member_count_updated_at.isoformat() if group.member_count_updated_at else None,
+        "days": days,
+        "totals": totals,
+        "daily": [{"date": day, "actions": actions} for day, actions in daily.items()],
+        "warnedUsers": warned_users,
+    }
+
+@app.get("/api/groups/{group_id}/settings")
+async def get_settings(group_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    key = ('settings', group_id)
+    cached = response_cache.get(key)
+    if cached is None:
+        repo = Repository(db)
+        settings = await repo.get_group_settings(group_id)
+        if not settings:
+            raise HTTPException(status_code=404, detail="Settings not found")
+        # ETag is a hash of the body, so new columns or payload fields also change it
+        cached = response_cache.set(key, orjson.dumps(settings_payload(settings)))
+    return cached_response(request, *cached)
+
+def settings_payload(settings: GroupSettings) -> dict:
+    group_id = settings.group_id
     return {
         "id": f"s{group_id}",
         "groupId": str(group_id),
         "deleteLinks": settings.delete_links,
         "deleteMentions": settings.delete_mentions,
         "deleteForwarded": settings.delete_forwards,
+        "forbiddenWords": settings.forbidden_words or [],
+        "forbiddenWordsWholeWord": settings.forbidden_words_whole_word,
         "allowPhotos": settings.allow_photos,
         "allowVideos": settings.allow_videos,
         "allowStickers": settings.allow_stickers,
@@ -131,64 +243,150 @@ async def get_settings(group_id: int, db: AsyncSession = Depends(get_db)):
         "captchaFailAction": settings.captcha_fail_action,
         "newUserReadOnly": settings.new_user_read_only,
         "readOnlyDurationSeconds": settings.read_only_duration,
+        "raidProtectionEnabled": settings.raid_protection_enabled,
+        "raidJoinThreshold": settings.raid_join_threshold,
+        "raidJoinWindowSeconds": settings.raid_join_window,
+        "raidLockdownMinutes": settings.raid_lockdown_minutes,
         "silentMode": settings.silent_mode,
         "botLanguage": settings.language,
-        "updatedAt": "2024-01-01T00:00:00Z" # TODO: Add updated_at to model
+        "version": settings.version,
+        "updatedAt": settings.updated_at.isoformat() if settings.updated_at else None
     }
 
 @app.post("/api/groups/{group_id}/settings")
 async def update_settings(group_id: int, data: SettingsUpdate, db: AsyncSession = Depends(get_db)):
     repo = Repository(db)
-    settings = await repo.get_group_settings(group_id)
+    # Fresh row from this session - cached objects must not be mutated
+    settings = await repo.get_group_settings(group_id, use_cache=False)
     if not settings:
         raise HTTPException(status_code=404, detail="Settings not found")
         
-    # Mapping
-    if data.deleteLinks is not None: settings.delete_links = data.deleteLinks
-    if data.deleteMentions is not None: settings.delete_mentions = data.deleteMentions
-    if data.deleteForwarded is not None: settings.delete_forwards = data.deleteForwarded
-    
-    if data.allowPhotos is not None: settings.allow_photos = data.allowPhotos
-    if data.allowVideos is not None: settings.allow_videos = data.allowVideos
-    if data.allowStickers is not None: settings.allow_stickers = data.allowStickers
-    if data.allowGifs is not None: settings.allow_gifs = data.allowGifs
-    
-    if data.floodControlEnabled is not None: settings.anti_spam_enabled = data.floodControlEnabled
-    if data.floodMessagesLimit is not None: settings.flood_threshold = data.floodMessagesLimit
-    if data.floodIntervalSeconds is not None: settings.flood_period = data.floodIntervalSeconds
-    if data.duplicateDetection is not None: settings.duplicate_detection = data.duplicateDetection
-    
-    if data.warnLimit is not None: settings.warn_limit = data.warnLimit
-    
-    if data.captchaEnabled is not None: settings.captcha_enabled = data.captchaEnabled
-    if data.captchaType is not None: settings.captcha_type = data.captchaType
-    if data.captchaTimeoutSeconds is not None: settings.captcha_timeout = data.captchaTimeoutSeconds
-    if data.captchaFailAction is not None: settings.captcha_fail_action = data.captchaFailAction
-    
-    if data.newUserReadOnly is not None: settings.new_user_read_only = data.newUserReadOnly
-    if data.readOnlyDurationSeconds is not None: settings.read_only_duration = data.readOnlyDurationSeconds
-    
-    if data.silentMode is not None: settings.silent_mode = data.silentMode
-    if data.botLanguage is not None: settings.language = data.botLanguage
+    for column, value in settings_values(data).items():
+        setattr(settings, column, value)
 
+    # updated_at is set by the column's onupdate
+    settings.version = GroupSettings.version + 1
     await db.commit()
+    settings_cache.invalidate(group_id)
+    return {"status": "ok"}
+
+class TemplateSave(BaseModel):
+    ownerId: int
+    name: str
+    settings: SettingsUpdate
+
+class BulkSettingsUpdate(BaseModel):
+    ownerId: int
+    groupIds: List[int]
+    templateId: Optional[int] = None # Applied first
+    settings: Optional[SettingsUpdate] = None # Overrides template fields
+
+@app.get("/api/templates")
+async def get_templates(userId: int, db: AsyncSession = Depends(get_db)):
+    repo = Repository(db)
+    templates = await repo.get_templates(userId)
+    return [
+        {
+            "id": t.id,
+            "name": t.name,
+            "settings": t.settings or {},
+            "updatedAt": t.updated_at.isoformat() if t.updated_at else None
+        }
+        for t in templates
+    ]
+
+@app.post("/api/templates")
+async def save_template(data: TemplateSave, db: AsyncSession = Depends(get_db)):
+    """Create or replace a named settings template of the owner"""
+    name = data.name.strip()
+    patch = data.settings.model_dump(exclude_none=True)
+    if not name or not patch:
+        raise HTTPException(status_code=400, detail="Template needs a name and at least one setting")
+    repo = Repository(db)
+    template_id = await repo.save_template(data.ownerId, name, patch)
+    return {"status": "ok", "id": template_id}
+
+@app.delete("/api/templates/{template_id}")
+async def delete_template(template_id: int, userId: int, db: AsyncSession = Depends(get_db)):
+    repo = Repository(db)
+    if not await repo.delete_template(userId, template_id):
+        raise HTTPException(status_code=404, detail="Template not found")
     return {"status": "ok"}
 
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+@app.post("/api/settings/bulk")
+async def bulk_update_settings(data: BulkSettingsUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Apply one patch (a template, explicit settings or both) to many groups of
+    the owner with a single UPDATE in one transaction
+    """
+    patch = {}
+    if data.templateId is not None:
+        template = await db.get(SettingsTemplate, data.templateId)
+        if not template or template.owner_id != data.ownerId:
+            raise HTTPException(status_code=404, detail="Template not found")
+        # Stored templates are validated again, fields may have changed since they were saved
+        try:
+            SettingsUpdate(**(template.settings or {}))
+        except ValidationError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Template '{template.name}' is no longer valid: {e.error_count()} invalid field(s), save it again"
+            )
+        patch.update(template.settings or {})
+    if data.settings is not None:
+        patch.update(data.settings.model_dump(exclude_none=True))
+
+    values = settings_values(SettingsUpdate(**patch))
+    group_ids = list(dict.fromkeys(data.groupIds))
+    if not values or not group_ids:
+        raise HTTPException(status_code=400, detail="Nothing to update")
+
+    repo = Repository(db)
+    updated = set(await repo.update_owned_settings(data.ownerId, group_ids, values))
+    await db.commit()
+    for group_id in updated:
+        settings_cache.invalidate(group_id)
+
+    return {
+        "status": "ok",
+        "updated": len(updated),
+        "results": [
+            {"groupId": str(group_id), "status": "updated" if group_id in updated else "not_found"}
+            for group_id in group_ids
+        ]
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format, for the bot running in this process"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(None)):
+    """Telegram updates in webhook mode (BOT_MODE=webhook)"""
+    if not hmac.compare_digest(x_telegram_bot_api_secret_token or "", WEBHOOK_SECRET):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    
+    update = await request.json()
+    # Full queue or not running -> 503, Telegram will redeliver
+    if not update_feeder.submit(update):
+        raise HTTPException(status_code=503, detail="Busy")
+    return Response(status_code=200)
+
+from bot.api.static import PrecompressedStaticFiles, file_response, REVALIDATE
 import os
 
-# Mount static assets
+# Mount static assets (hashed file names, cached for a year, .br/.gz from bot.api.static)
 if os.path.exists("webapp/dist/assets"):
-    app.mount("/assets", StaticFiles(directory="webapp/dist/assets"), name="assets")
+    app.mount("/assets", PrecompressedStaticFiles(directory="webapp/dist/assets"), name="assets")
 
 # Serve index.html for root and other routes (SPA)
 @app.get("/{full_path:path}")
-async def serve_spa(full_path: str):
+async def serve_spa(full_path: str, request: Request):
     if full_path.startswith("api"):
         raise HTTPException(status_code=404, detail="API endpoint not found")
     
     index_path = "webapp/dist/index.html"
     if os.path.exists(index_path):
-        return FileResponse(index_path)
+        return file_response(index_path, request.headers, REVALIDATE)
     return {"message": "Frontend not built or not found. Please run build."}
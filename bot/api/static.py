@@ -0,0 +1,94 @@
+import os
+import sys
+import gzip
+import logging
+import mimetypes
+from typing import Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.types import Scope
+from bot.api.cache import etag_matches
+
+# Preferred first, files are written next to the original by precompress()
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESSIBLE = ('.js', '.css', '.html', '.svg', '.json', '.txt', '.map', '.ico', '.webmanifest')
+MIN_SIZE = 1024 # bytes, smaller files are not worth a second request header
+
+# Vite puts a content hash in every asset file name, index.html must always be revalidated
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+def accepted_encodings(headers: Headers) -> set:
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if name.strip() and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.strip().lower())
+    return accepted
+
+def precompressed_variant(full_path: str, headers: Headers) -> Tuple[str, Optional[str]]:
+    """(path to send, content encoding) for the best variant the client accepts"""
+    accepted = accepted_encodings(headers)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+def file_response(full_path: str, headers: Headers, cache_control: str, status_code: int = 200) -> Response:
+    path, encoding = precompressed_variant(full_path, headers)
+    media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+    response = FileResponse(path, status_code=status_code, media_type=media_type, stat_result=os.stat(path))
+    response.headers["cache-control"] = cache_control
+    response.headers["vary"] = "Accept-Encoding"
+    if encoding:
+        response.headers["content-encoding"] = encoding
+    # Every variant has its own ETag (stat based), so a 304 is always for the right encoding
+    if etag_matches(headers.get("if-none-match"), response.headers["etag"]):
+        return NotModifiedResponse(response.headers)
+    return response
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving the .br / .gz sibling of a file when the client accepts it"""
+
+    def __init__(self, *args, cache_control: str = IMMUTABLE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        return file_response(str(full_path), Headers(scope=scope), self.cache_control, status_code)
+
+def precompress(directory: str) -> int:
+    """Write .gz (and .br when brotli is installed) next to every compressible file"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        logging.warning("brotli not installed, writing gzip only")
+
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < MIN_SIZE:
+                continue
+            variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', brotli.compress(data, quality=11)))
+            for suffix, compressed in variants:
+                # Skip variants that do not save anything
+                if len(compressed) < len(data):
+                    with open(path + suffix, "wb") as f:
+                        f.write(compressed)
+            count += 1
+    return count
+
+if __name__ == "__main__":
+    # python -m bot.api.static webapp/dist (run after the frontend build)
+    logging.basicConfig(level=logging.INFO)
+    directory = sys.argv[1] if len(sys.argv) > 1 else "webapp/dist"
+    logging.info(f"Precompressed {precompress(directory)} files in {directory}")
@@ -0,0 +1,175 @@
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing
+from typing import List, Optional
+from aiogram import Bot
+from bot.services.sharding import HashRing, ShardRouter, shard
+from bot.services.settings_cache import settings_cache
+from bot.services.webhook import update_feeder
+from bot.services.outbox import outbox, TokenBucket
+from bot.services.metrics import registry
+from config import BOT_MODE, SHARD_QUEUE_SIZE, OUTBOX_GLOBAL_RATE
+
+# Control messages sent from the parent to a worker, as (name, payload)
+INVALIDATE_SETTINGS = 'invalidate_settings'
+
+POLL_TIMEOUT = 30 # seconds, long polling
+SUPERVISE_INTERVAL = 5 # seconds between worker liveness checks
+
+def shard_worker(index: int, count: int, updates, restarted: bool):
+    """Worker process entry point (spawned, so it starts from a clean interpreter)"""
+    # Ctrl+C reaches the whole process group, the parent coordinates the shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=f"[shard {index}] %(levelname)s:%(name)s:%(message)s")
+    shard.configure(index, count, restarted)
+    asyncio.run(_run_worker(updates))
+
+async def _run_worker(updates):
+    from bot.main import create_bot, create_dispatcher
+
+    # The global Bot API limit is per token, every worker gets its share
+    rate = OUTBOX_GLOBAL_RATE / shard.count
+    outbox.global_bucket = TokenBucket(rate, rate)
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    # Chat -> feeder worker mapping keeps each chat's updates in order
+    update_feeder.start(bot, dp, **workflow_data)
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    try:
+        while True:
+            try:
+                item = await loop.run_in_executor(None, updates.get, True, 1)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    logging.error("Parent process is gone, stopping")
+                    break
+                continue
+            if item is None:
+                break
+            if isinstance(item, tuple):
+                _handle_control(*item)
+            else:
+                await update_feeder.put(item)
+    finally:
+        await update_feeder.stop()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+
+def _handle_control(name: str, payload):
+    if name == INVALIDATE_SETTINGS:
+        settings_cache.invalidate(payload)
+    else:
+        logging.warning(f"Unknown control message {name}")
+
+class Cluster:
+    """
+    Parent side: N worker processes, one update queue each.
+    Updates are routed by chat id on a consistent hash ring, dead workers are
+    restarted on the same queue so no chat changes owner.
+    """
+
+    def __init__(self, count: int):
+        self.count = count
+        self.ctx = multiprocessing.get_context("spawn")
+        self.queues = [self.ctx.Queue(maxsize=SHARD_QUEUE_SIZE) for _ in range(count)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * count
+        self.router = ShardRouter(HashRing(count), self.queues)
+
+    def spawn(self, index: int, restarted: bool = False):
+        process = self.ctx.Process(
+            target=shard_worker,
+            args=(index, self.count, self.queues[index], restarted),
+            name=f"shard-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        logging.info(f"Started shard {index} (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.count):
+            self.spawn(index)
+
+    def invalidate_settings(self, group_id: int):
+        # API writes happen in this process, the owning worker caches the settings
+        if not self.router.control(group_id, INVALIDATE_SETTINGS, group_id):
+            logging.warning(f"Shard queue full, settings of {group_id} stay cached until TTL")
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(SUPERVISE_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    logging.error(f"Shard {index} exited with code {process.exitcode}, restarting")
+                    self.spawn(index, restarted=True)
+
+    async def stop(self, timeout: float = 15):
+        loop = asyncio.get_running_loop()
+        for q in self.queues:
+            try:
+                await loop.run_in_executor(None, q.put, None, True, timeout)
+            except queue.Full:
+                pass
+        for process in self.processes:
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, timeout)
+            if process.is_alive():
+                logging.warning(f"{process.name} did not stop in time, terminating")
+                process.terminate()
+
+async def poll(bot: Bot, router: ShardRouter, allowed_updates):
+    """getUpdates in the parent, updates go to the shards as raw dicts"""
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates,
+                request_timeout=POLL_TIMEOUT + 10
+            )
+        except Exception as e:
+            logging.error(f"getUpdates failed: {e}")
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            raw = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+            # Backpressure: wait for the shard instead of dropping
+            while not router.submit(raw):
+                await asyncio.sleep(0.05)
+            offset = update.update_id + 1
+
+async def run_cluster(count: int):
+    """
+    Sharded mode. This process does ingress (polling or the webhook route of
+    the API) and forwards updates, `count` worker processes run dispatchers.
+    """
+    from bot.main import create_bot, create_dispatcher, init_db, register_webhook
+
+    await init_db()
+    cluster = Cluster(count)
+    cluster.start()
+    settings_cache.listeners.append(cluster.invalidate_settings)
+    registry.gauge("bot_shard_queue_depth", "Updates waiting in shard queues", cluster.router.depth)
+
+    bot = create_bot()
+    allowed_updates = create_dispatcher().resolve_used_update_types()
+    supervisor = asyncio.create_task(cluster.supervise())
+    try:
+        if BOT_MODE == 'webhook':
+            update_feeder.forward(cluster.router.submit)
+            await register_webhook(bot, allowed_updates)
+            await asyncio.Event().wait()
+        else:
+            await poll(bot, cluster.router, allowed_updates)
+    finally:
+        supervisor.cancel()
+        update_feeder.forward(None)
+        settings_cache.listeners.remove(cluster.invalidate_settings)
+        await cluster.stop()
+        await bot.session.close()
@@ -1,15 +1,97 @@
+import time
+import logging
+from sqlalchemy import event, inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.dialects import postgresql, sqlite
 from typing import AsyncGenerator
 
 class Base(DeclarativeBase):
     pass
 
-from config import DATABASE_URL
+from config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+pool_options = {}
+if not DATABASE_URL.startswith("sqlite"):
+    pool_options = dict(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+engine = create_async_engine(DATABASE_URL, echo=False, **pool_options)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+from bot.services.metrics import db_query_seconds, db_errors_total
+
+def _statement_kind(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    db_query_seconds.observe(time.perf_counter() - started, _statement_kind(statement))
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+    db_errors_total.inc(_statement_kind(context.statement or ""))
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+def upsert(table):
+    """
+    Dialect specific INSERT supporting on_conflict_do_update / on_conflict_do_nothing.
+    Both Postgres and SQLite share the same ON CONFLICT syntax.
+    """
+    if engine.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+def sync_schema(conn):
+    """
+    create_all() only creates missing tables. Add columns and indexes that were
+    added to the models later (Quick & Dirty migration for prototype, run via run_sync).
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+            logging.info(f"Added column {table.name}.{column.name}")
+
+        existing_indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing_indexes:
+                continue
+            if index.unique:
+                _drop_duplicates(conn, table, [c.name for c in index.columns])
+            index.create(conn, checkfirst=True)
+            logging.info(f"Created index {index.name}")
+
+def _drop_duplicates(conn, table, columns):
+    """Keep the newest row (highest primary key) per key so a unique index can be built"""
+    pk = table.primary_key.columns.values()[0].name
+    keys = ", ".join(columns)
+    result = conn.execute(text(
+        f"DELETE FROM {table.name} WHERE {pk} NOT IN "
+        f"(SELECT MAX({pk}) FROM {table.name} GROUP BY {keys})"
+    ))
+    if result.rowcount:
+        logging.warning(f"Removed {result.rowcount} duplicate rows from {table.name} ({keys})")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, BigInteger, Text, ARRAY, JSON
+from sqlalchemy import Index, Column, Integer, String, Boolean, ForeignKey, Date, DateTime, BigInteger, Text, ARRAY, JSON, false, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from bot.database.core import Base
@@ -18,6 +18,9 @@ class User(Base):
     slots_limit = Column(Integer, default=1)
     sub_expires_at = Column(DateTime, nullable=True)
     
+    # Set when a private message fails with 403, broadcasts skip these users
+    is_blocked = Column(Boolean, default=False, server_default=false())
+    
     groups = relationship("Group", back_populates="owner")
 
 class Group(Base):
@@ -25,11 +28,18 @@ class Group(Base):
     
     id = Column(BigInteger, primary_key=True) # Telegram Chat ID (usually negative)
     title = Column(String, nullable=True)
-    owner_id = Column(BigInteger, ForeignKey('users.id'))
+    owner_id = Column(BigInteger, ForeignKey('users.id'), index=True) # Web app lists groups by owner
     
     is_premium = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Cached get_chat_member_count, refreshed by bot.services.member_counts
+    member_count = Column(Integer, nullable=True)
+    member_count_updated_at = Column(DateTime, nullable=True)
+    
+    # Last seen message, coarse (bot.services.activity), picks the groups warmed up at startup
+    last_active_at = Column(DateTime, nullable=True, index=True)
+    
     owner = relationship("User", back_populates="groups")
     settings = relationship("GroupSettings", uselist=False, back_populates="group")
     warns = relationship("Warn", back_populates="group", cascade="all, delete-orphan")
@@ -46,6 +56,7 @@ class GroupSettings(Base):
     delete_forwards = Column(Boolean, default=True)
     delete_mentions = Column(Boolean, default=False)
     forbidden_words = Column(JSON, default=list) # List of strings
+    forbidden_words_whole_word = Column(Boolean, default=False, server_default=false()) # Match whole words only
     
     # Media Toggles
     allow_photos = Column(Boolean, default=True)
@@ -69,6 +80,12 @@ class GroupSettings(Base):
     new_user_read_only = Column(Boolean, default=False)
     read_only_duration = Column(Integer, default=300) # seconds
 
+    # Raid Protection (join-rate based lockdown)
+    raid_protection_enabled = Column(Boolean, default=False, server_default=false()) # Opt-in
+    raid_join_threshold = Column(Integer, default=15, server_default=text('15')) # joins per window
+    raid_join_window = Column(Integer, default=60, server_default=text('60')) # seconds
+    raid_lockdown_minutes = Column(Integer, default=30, server_default=text('30')) # mute raiders for
+
     # Bot Behavior
     silent_mode = Column(Boolean, default=False)
     
@@ -77,8 +94,27 @@ class GroupSettings(Base):
     warn_action = Column(String, default='mute') # kick, ban, mute
     mute_duration = Column(Integer, default=60) # minutes
     
+    # Bumped on every write, the API derives ETags from it
+    version = Column(Integer, default=1, server_default=text('1'), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
     group = relationship("Group", back_populates="settings")
 
+class SettingsTemplate(Base):
+    __tablename__ = 'settings_templates'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    owner_id = Column(BigInteger, ForeignKey('users.id'))
+    name = Column(String, nullable=False)
+    settings = Column(JSON, default=dict) # SettingsUpdate fields as sent by the Mini App
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Saving a template under an existing name replaces it
+        Index('ix_settings_templates_owner_name', 'owner_id', 'name', unique=True),
+    )
+
 class Warn(Base):
     __tablename__ = 'warns'
     
@@ -90,6 +126,11 @@ class Warn(Base):
     updated_at = Column(DateTime, default=datetime.utcnow)
     
     group = relationship("Group", back_populates="warns")
+    
+    __table_args__ = (
+        # One counter row per member, target of add_warn's ON CONFLICT
+        Index('ix_warns_group_user', 'group_id', 'user_id', unique=True),
+    )
 
 class ModerationLog(Base):
     __tablename__ = 'moderation_logs'
@@ -100,3 +141,48 @@ class ModerationLog(Base):
     action = Column(String) # kick, ban, mute, warn, delete
     reason = Column(String)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_moderation_logs_group_timestamp', 'group_id', 'timestamp'),
+    )
+
+class CaptchaDeadline(Base):
+    __tablename__ = 'captcha_deadlines'
+    
+    chat_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
+    message_id = Column(BigInteger, nullable=True) # Captcha prompt to clean up
+    deadline = Column(DateTime) # UTC
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    text = Column(Text)
+    report_chat_id = Column(BigInteger) # Where the final report goes
+    status = Column(String, default='running') # running, done, cancelled
+    last_user_id = Column(BigInteger, default=0) # Keyset cursor, every user up to it is handled
+    sent = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    blocked = Column(Integer, default=0)
+    elapsed = Column(Integer, default=0) # seconds spent sending, across restarts
+    owner = Column(String, nullable=True) # Process currently sending it
+    lease_until = Column(DateTime, nullable=True) # Others may take it over after this
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class ModerationDailyStat(Base):
+    __tablename__ = 'moderation_daily_stats'
+    
+    # Rolled up from moderation_logs by bot.services.log_rollup
+    group_id = Column(BigInteger, primary_key=True)
+    day = Column(Date, primary_key=True) # UTC
+    action = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+
+class RollupState(Base):
+    __tablename__ = 'rollup_state'
+    
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, default=0) # High-water mark, rows up to this id are counted
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -1,11 +1,11 @@
 from aiogram import Router
 
 # Shared routers export
-group_router = Router()
-admin_router = Router()
-private_router = Router()
-owner_router = Router()
-new_member_router = Router()
+group_router = Router(name="group")
+admin_router = Router(name="admin")
+private_router = Router(name="private")
+owner_router = Router(name="owner")
+new_member_router = Router(name="new_member")
 
 # Import handlers to register them
 from . import group, admin, private, owner, new_member
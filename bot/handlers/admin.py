@@ -4,22 +4,23 @@ from bot.handlers import admin_router
 from bot.locales.i18n import LocalizationService
 from bot.services.repository import Repository
 from bot.services.moderator import ModerationService
+from bot.services.admin_cache import admin_cache
+from bot.services.outbox import outbox
 import time
 
-async def get_lang(repo, chat_id):
-    settings = await repo.get_group_settings(chat_id)
+async def get_lang(repo, chat_id, group_settings=None):
+    settings = group_settings or await repo.get_group_settings(chat_id)
     return settings.language
 
 @admin_router.message(Command("ban"))
-async def cmd_ban(message: types.Message, session):
+async def cmd_ban(message: types.Message, session, group_settings=None):
     if message.chat.type not in ['group', 'supergroup']:
         return 
         
     repo = Repository(session)
-    lang = await get_lang(repo, message.chat.id)
+    lang = await get_lang(repo, message.chat.id, group_settings)
         
-    member = await message.chat.get_member(message.from_user.id)
-    if member.status not in ['administrator', 'creator']:
+    if not await admin_cache.is_admin(message.bot, message.chat.id, message.from_user.id):
         return await message.reply(LocalizationService.get(lang, 'error_no_permission'))
 
     if not message.reply_to_message:
@@ -32,34 +33,32 @@ async def cmd_ban(message: types.Message, session):
         await repo.log_action(message.chat.id, user_to_ban.id, 'ban')
         
         text = LocalizationService.get(lang, 'ban_user', user=user_to_ban.full_name)
-        await message.answer(text)
+        outbox.notify(message.bot, message.chat.id, text)
     except Exception as e:
         await message.reply(f"Error: {e}")
 
 @admin_router.message(Command("unban"))
-async def cmd_unban(message: types.Message, session):
+async def cmd_unban(message: types.Message, session, group_settings=None):
     if message.chat.type not in ['group', 'supergroup']: return
     repo = Repository(session)
-    lang = await get_lang(repo, message.chat.id)
+    lang = await get_lang(repo, message.chat.id, group_settings)
     
-    member = await message.chat.get_member(message.from_user.id)
-    if member.status not in ['administrator', 'creator']:
+    if not await admin_cache.is_admin(message.bot, message.chat.id, message.from_user.id):
         return await message.reply(LocalizationService.get(lang, 'error_no_permission'))
         
     if not message.reply_to_message: return await message.reply("Reply to user.")
     
     user = message.reply_to_message.from_user
-    await message.chat.unban_member(user.id)
-    await message.answer(f"User {user.full_name} unbanned.")
+    await outbox.call(message.chat.id, lambda: message.chat.unban_member(user.id))
+    outbox.notify(message.bot, message.chat.id, f"User {user.full_name} unbanned.")
 
 @admin_router.message(Command("mute"))
-async def cmd_mute(message: types.Message, session):
+async def cmd_mute(message: types.Message, session, group_settings=None):
     if message.chat.type not in ['group', 'supergroup']: return
     repo = Repository(session)
-    lang = await get_lang(repo, message.chat.id)
+    lang = await get_lang(repo, message.chat.id, group_settings)
         
-    member = await message.chat.get_member(message.from_user.id)
-    if member.status not in ['administrator', 'creator']:
+    if not await admin_cache.is_admin(message.bot, message.chat.id, message.from_user.id):
         return await message.reply(LocalizationService.get(lang, 'error_no_permission'))
 
     if not message.reply_to_message:
@@ -77,18 +76,17 @@ async def cmd_mute(message: types.Message, session):
         await repo.log_action(message.chat.id, user_to_mute.id, 'mute', f"{duration}m")
         
         text = LocalizationService.get(lang, 'mute_user', user=user_to_mute.full_name, duration=duration)
-        await message.answer(text)
+        outbox.notify(message.bot, message.chat.id, text)
     except Exception as e:
         await message.reply(f"Error: {e}")
 
 @admin_router.message(Command("warn"))
-async def cmd_warn(message: types.Message, session):
+async def cmd_warn(message: types.Message, session, group_settings=None):
     if message.chat.type not in ['group', 'supergroup']: return
     repo = Repository(session)
-    lang = await get_lang(repo, message.chat.id)
+    lang = await get_lang(repo, message.chat.id, group_settings)
     
-    member = await message.chat.get_member(message.from_user.id)
-    if member.status not in ['administrator', 'creator']:
+    if not await admin_cache.is_admin(message.bot, message.chat.id, message.from_user.id):
         return await message.reply(LocalizationService.get(lang, 'error_no_permission'))
         
     if not message.reply_to_message: return await message.reply("Reply to a user.")
@@ -100,28 +98,27 @@ async def cmd_warn(message: types.Message, session):
     user = message.reply_to_message.from_user
     count = await repo.add_warn(message.chat.id, user.id, reason)
     
-    settings = await repo.get_group_settings(message.chat.id)
+    settings = group_settings or await repo.get_group_settings(message.chat.id)
     limit = settings.warn_limit
     
     if count >= limit:
         action = settings.warn_action
         await ModerationService.punish_user(message.bot, message.chat.id, user.id, action, settings.mute_duration)
         await repo.reset_warns(message.chat.id, user.id)
-        await message.answer(f"User {user.full_name} reached warn limit ({limit}). Action: {action}")
+        outbox.notify(message.bot, message.chat.id, f"User {user.full_name} reached warn limit ({limit}). Action: {action}")
     else:
         text = LocalizationService.get(lang, 'warn_user', user=user.full_name, reason=reason, count=count, limit=limit)
-        await message.answer(text)
+        outbox.notify(message.bot, message.chat.id, text)
 
 @admin_router.message(Command("settings"))
-async def cmd_settings(message: types.Message, session):
+async def cmd_settings(message: types.Message, session, group_settings=None):
     if message.chat.type not in ['group', 'supergroup']: return
     repo = Repository(session)
     
-    member = await message.chat.get_member(message.from_user.id)
-    if member.status not in ['administrator', 'creator']:
+    if not await admin_cache.is_admin(message.bot, message.chat.id, message.from_user.id):
         return 
         
-    settings = await repo.get_group_settings(message.chat.id)
+    settings = group_settings or await repo.get_group_settings(message.chat.id)
     text = (f"<b>Settings:</b>\n"
             f"Lang: {settings.language}\n"
             f"Links: {'✅' if settings.delete_links else '❌'}\n"
@@ -129,4 +126,4 @@ async def cmd_settings(message: types.Message, session):
             f"Spam: {'✅' if settings.anti_spam_enabled else '❌'}\n"
             f"Warns: {settings.warn_limit} (Action: {settings.warn_action})")
             
-    await message.answer(text)
+    outbox.notify(message.bot, message.chat.id, text)
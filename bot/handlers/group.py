@@ -1,13 +1,22 @@
+import logging
 from aiogram import F, Router, types
 from aiogram.filters import Command, ChatMemberUpdatedFilter, JOIN_TRANSITION, LEAVE_TRANSITION
 from bot.handlers import group_router
 from bot.services.moderator import ModerationService
+from bot.services.pipeline import MessageContext, FLOOD, MEDIA, get_pipeline
 from bot.services.repository import Repository
+from bot.services.admin_cache import admin_cache
+from bot.services.user_writer import user_writer
+from bot.services.activity import group_activity
+from bot.services.outbox import outbox
+from bot.services.album_deleter import album_deleter
+from bot.services.member_counts import member_counts
 from bot.locales.i18n import LocalizationService
 from aiogram.enums import ChatMemberStatus
 
 @group_router.my_chat_member(ChatMemberUpdatedFilter(member_status_changed=JOIN_TRANSITION))
 async def on_bot_join(event: types.ChatMemberUpdated, session, bot):
+    track_admin_status(event)
     repo = Repository(session)
     # Register group and owner
     # The user who added the bot is in event.from_user
@@ -23,6 +32,7 @@ async def on_bot_join(event: types.ChatMemberUpdated, session, bot):
         full_name=event.from_user.full_name,
         language=event.from_user.language_code
     )
+    member_counts.request(event.chat.id)
     
     # Send welcome message to the GROUP chat
     await bot.send_message(
@@ -31,92 +41,132 @@ async def on_bot_join(event: types.ChatMemberUpdated, session, bot):
              "Sozlamalarni o'zgartirish uchun botga shaxsiy xabar yuboring va 'Konstruktor' tugmasini bosing."
     )
 
+def track_admin_status(event: types.ChatMemberUpdated):
+    admin_cache.update_member(event.chat.id, event.new_chat_member.user.id, event.new_chat_member.status)
+
+@group_router.my_chat_member()
+async def on_bot_status_change(event: types.ChatMemberUpdated):
+    # Bot promoted / demoted / removed (join is handled by on_bot_join)
+    track_admin_status(event)
+
+@group_router.chat_member()
+async def on_member_status_change(event: types.ChatMemberUpdated):
+    # Keeps the admin cache current without a get_member per message
+    track_admin_status(event)
+
+async def delete_media(message: types.Message, repo: Repository):
+    if await admin_cache.is_exempt(message.bot, message.chat.id, message.from_user.id):
+        return
+    await repo.log_action(message.chat.id, message.from_user.id, 'delete', MEDIA)
+    if message.media_group_id:
+        # Album items arrive as separate updates, removed together
+        album_deleter.delete(message.bot, message.chat.id, message.media_group_id, message.message_id)
+        return
+    try:
+        await outbox.call(message.chat.id, message.delete)
+    except Exception as e:
+        logging.warning(f"Failed to delete media {message.message_id} in {message.chat.id}: {e}")
+
 @group_router.message(F.chat.type.in_({'group', 'supergroup'}))
-async def handle_group_message(message: types.Message, session):
+async def handle_group_message(message: types.Message, session, group_settings=None):
     repo = Repository(session)
     
-    # 1. Ensure User and Group exist in DB
-    user = await repo.upsert_user(
+    # 1. Ensure User and Group exist in DB (user profile is written behind in bulk)
+    user_writer.touch(
         user_id=message.from_user.id,
         username=message.from_user.username,
         full_name=message.from_user.full_name,
         language=message.from_user.language_code
     )
+    group_activity.touch(message.chat.id)
     
     # Ensure group exists (often handled by my_chat_member handler, but good to be safe)
     # We don't have the owner ID easily here if it's a new group we haven't seen.
     # For now, we assume group exists or get_group_settings creates a default one (without owner maybe).
     # Ideally, we listen to 'new_chat_members' (bot added) to set owner.
     
-    settings = await repo.get_group_settings(message.chat.id)
+    # Normally resolved by I18nMiddleware for this update
+    settings = group_settings or await repo.get_group_settings(message.chat.id)
     
-    # 2. Permission Check (Admins are immune)
-    member = await message.chat.get_member(message.from_user.id)
-    if member.status in [ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR]:
+    # 2. Compiled per-group rule chain (rebuilt only when settings change)
+    pipeline = get_pipeline(settings)
+    if pipeline.empty:
+        return
+
+    # 3. Disallowed media: delete only, before any text processing
+    if pipeline.media_blocked(message.content_type):
+        await delete_media(message, repo)
+        return
+
+    ctx = MessageContext(
+        message.text or message.caption,
+        entities=message.entities or message.caption_entities,
+        is_forward=bool(message.forward_origin)
+    )
+    reason_key = await pipeline.run(ctx, message.chat.id, message.from_user.id)
+    if reason_key is None:
         return
 
-    # 3. Anti-Spam / Flood
-    if await ModerationService.is_flood(message.from_user.id, message.chat.id, settings):
+    # 4. Permission Check (Admins are immune, so is everyone while admins are unknown), only once a rule matched
+    if await admin_cache.is_exempt(message.bot, message.chat.id, message.from_user.id):
+        return
+
+    # 5. Anti-Spam / Flood
+    if reason_key == FLOOD:
         try:
-            await message.delete()
+            await outbox.call(message.chat.id, message.delete)
             # Optional: Mute for flood
             await ModerationService.punish_user(message.bot, message.chat.id, message.from_user.id, 'mute', duration_minutes=5)
             await repo.log_action(message.chat.id, message.from_user.id, 'mute', 'flood')
-            return
         except Exception:
-            pass
+            logging.exception(f"Flood handling failed for {message.from_user.id} in {message.chat.id}")
+        return
 
-    # 4. Content Moderation
-    should_delete, reason_key = ModerationService.check_message(
-        text=message.text or message.caption,
-        settings=settings,
-        is_forward=bool(message.forward_origin),
-        entities=message.entities or message.caption_entities
-    )
-    
-    if should_delete:
-        try:
-            await message.delete()
-            await repo.log_action(message.chat.id, message.from_user.id, 'delete', reason_key)
-            
-            # Warn System
-            warn_count = await repo.add_warn(message.chat.id, message.from_user.id, reason_key)
-            
-            # Helper to get text
-            reason_text = LocalizationService.get(settings.language, reason_key)
-            limit = settings.warn_limit
+    # 6. Content Moderation: delete, warn, punish at the limit
+    thread_id = message.message_thread_id if message.is_topic_message else None
+    try:
+        await outbox.call(message.chat.id, message.delete)
+        await repo.log_action(message.chat.id, message.from_user.id, 'delete', reason_key)
+        
+        # Warn System
+        warn_count = await repo.add_warn(message.chat.id, message.from_user.id, reason_key)
+        
+        # Helper to get text
+        reason_text = LocalizationService.get(settings.language, reason_key)
+        limit = settings.warn_limit
+        
+        if warn_count >= limit:
+            # Punish
+            action = settings.warn_action # mute, kick, ban
+            success = await ModerationService.punish_user(
+                message.bot, 
+                message.chat.id, 
+                message.from_user.id, 
+                action, 
+                duration_minutes=settings.mute_duration
+            )
             
-            if warn_count >= limit:
-                # Punish
-                action = settings.warn_action # mute, kick, ban
-                success = await ModerationService.punish_user(
-                    message.bot, 
-                    message.chat.id, 
-                    message.from_user.id, 
-                    action, 
-                    duration_minutes=settings.mute_duration
-                )
+            if success:
+                # Reset warns
+                await repo.reset_warns(message.chat.id, message.from_user.id)
                 
-                if success:
-                    # Reset warns
-                    await repo.reset_warns(message.chat.id, message.from_user.id)
-                    
-                    # Notify
-                    msg_key = f"{action}_user"
-                    text = LocalizationService.get(settings.language, msg_key, user=message.from_user.full_name, duration=settings.mute_duration)
-                    await message.answer(text)
-            else:
-                # Just warn
-                text = LocalizationService.get(
-                    settings.language, 
-                    'warn_user', 
-                    user=message.from_user.mention_html(), 
-                    reason=reason_text, 
-                    count=warn_count, 
-                    limit=limit
-                )
-                await message.answer(text)
-                
-        except Exception as e:
-            print(f"Mod error: {e}")
+                # Notify
+                msg_key = f"{action}_user"
+                text = LocalizationService.get(settings.language, msg_key, user=message.from_user.full_name, duration=settings.mute_duration)
+                outbox.notify(message.bot, message.chat.id, text, message_thread_id=thread_id)
+        else:
+            # Just warn
+            text = LocalizationService.get(
+                settings.language, 
+                'warn_user', 
+                user=message.from_user.mention_html(), 
+                reason=reason_text, 
+                count=warn_count, 
+                limit=limit
+            )
+            # Warns piling up in a burst are merged into one message
+            outbox.notify(message.bot, message.chat.id, text, coalesce_key=('warn', message.chat.id, thread_id), message_thread_id=thread_id)
+            
+    except Exception:
+        logging.exception(f"Moderation failed for {message.from_user.id} in {message.chat.id}")
 
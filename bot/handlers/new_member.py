@@ -1,18 +1,35 @@
-import asyncio
+import time
+import logging
 from aiogram import Router, F, types, Bot
 from aiogram.types import ChatPermissions, InlineKeyboardMarkup, InlineKeyboardButton
+from bot.handlers import new_member_router
 from bot.services.repository import Repository
+from bot.services.captcha_scheduler import captcha_scheduler
+from bot.services.moderator import ModerationService
+from bot.services.outbox import outbox
+from bot.services.raid import raid_guard
 from bot.locales.i18n import LocalizationService
 
-new_member_router = Router()
+# Longer join batches are summarized as "+N"
+MAX_PROMPT_MENTIONS = 30
 
 @new_member_router.message(F.new_chat_members)
-async def on_new_members(message: types.Message, session, lang):
+async def on_new_members(message: types.Message, session, lang, group_settings=None):
     """
     Handle new members joining the group via Message event.
     """
     repo = Repository(session)
-    settings = await repo.get_group_settings(message.chat.id)
+    settings = group_settings or await repo.get_group_settings(message.chat.id)
+    
+    newcomers = [user for user in message.new_chat_members if not user.is_bot]
+    if not newcomers:
+        return
+
+    # Raid lockdown: mute everybody right away, no prompts
+    was_locked = raid_guard.is_locked(message.chat.id)
+    if raid_guard.record_joins(settings, len(newcomers)):
+        await lockdown_newcomers(message, settings, lang, newcomers, announce=not was_locked)
+        return
     
     if not settings.captcha_enabled:
         return
@@ -29,47 +46,66 @@ async def on_new_members(message: types.Message, session, lang):
         can_pin_messages=False
     )
     
-    for user in message.new_chat_members:
-        if user.is_bot: continue
-            
-        try:
-            # Mute user
-            await message.chat.restrict(user.id, restrict_perms)
-            
-            # Send Captcha
-            text = LocalizationService.get(lang, 'captcha_prompt', user=user.mention_html())
-            btn_text = LocalizationService.get(lang, 'captcha_btn')
-            
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text=btn_text, callback_data=f"captcha_solve:{user.id}")]
-            ])
-            
-            msg = await message.answer(text, reply_markup=kb)
-            
-            # Schedule timeout
-            asyncio.create_task(captcha_timeout(message.bot, message.chat.id, user.id, msg.message_id, settings.captcha_timeout))
-            
-        except Exception as e:
-            print(f"Error in captcha: {e}")
+    try:
+        # Mute the whole join batch concurrently
+        restricted = await ModerationService.restrict_many(
+            message.bot, message.chat.id, [user.id for user in newcomers], restrict_perms
+        )
+        if not restricted:
+            return
+
+        # Per-user deadlines first (persisted, handled by the scheduler loop),
+        # so a failed prompt still ends in a timeout instead of a permanent mute
+        await captcha_scheduler.schedule_many(message.chat.id, restricted, None, settings.captcha_timeout)
+        
+        # One combined captcha prompt for everybody in this update
+        restricted_ids = set(restricted)
+        mentions = [user.mention_html() for user in newcomers if user.id in restricted_ids]
+        if len(mentions) > MAX_PROMPT_MENTIONS:
+            mentions = mentions[:MAX_PROMPT_MENTIONS] + [f"+{len(mentions) - MAX_PROMPT_MENTIONS}"]
+        text = LocalizationService.get(lang, 'captcha_prompt', user=", ".join(mentions))
+        btn_text = LocalizationService.get(lang, 'captcha_btn')
+        
+        # Single user keeps the personal button, groups of joiners share one
+        callback_data = f"captcha_solve:{restricted[0]}" if len(restricted) == 1 else "captcha_solve"
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=btn_text, callback_data=callback_data)]
+        ])
+        
+        msg = await outbox.call(message.chat.id, lambda: message.answer(text, reply_markup=kb))
+        await captcha_scheduler.attach_prompt(message.chat.id, restricted, msg.message_id)
+        
+    except Exception as e:
+        logging.error(f"Error in captcha: {e}")
 
-async def captcha_timeout(bot: Bot, chat_id: int, user_id: int, message_id: int, timeout: int):
-    await asyncio.sleep(timeout)
+async def lockdown_newcomers(message: types.Message, settings, lang, newcomers, announce: bool):
+    chat_id = message.chat.id
+    user_ids = [user.id for user in newcomers]
+    # Remember them first so messages already in flight get dropped
+    raid_guard.add_raiders(chat_id, user_ids)
+    until_date = int(time.time()) + settings.raid_lockdown_minutes * 60
     try:
-        # Check member status
-        member = await bot.get_chat_member(chat_id, user_id)
-        if member.status == 'restricted' and not member.can_send_messages:
-            # Still restricted -> Kick
-            await bot.ban_chat_member(chat_id, user_id)
-            await bot.unban_chat_member(chat_id, user_id) # Kick (unban allows rejoin)
-            await bot.delete_message(chat_id, message_id)
+        await ModerationService.restrict_many(
+            message.bot, chat_id, user_ids, ChatPermissions(can_send_messages=False), until_date=until_date
+        )
     except Exception as e:
-        print(f"Timeout error: {e}")
+        logging.error(f"Error in raid lockdown: {e}")
+
+    if announce:
+        outbox.notify(
+            message.bot, chat_id,
+            LocalizationService.get(lang, 'raid_lockdown', minutes=settings.raid_lockdown_minutes)
+        )
 
-@new_member_router.callback_query(F.data.startswith("captcha_solve:"))
+@new_member_router.callback_query(F.data.startswith("captcha_solve"))
 async def on_captcha_solve(callback: types.CallbackQuery, bot: Bot):
-    user_id = int(callback.data.split(":")[1])
+    chat_id = callback.message.chat.id
+    user_id = callback.from_user.id
     
-    if callback.from_user.id != user_id:
+    # "captcha_solve:<id>" is personal, plain "captcha_solve" is shared by a join batch
+    target = callback.data.partition(":")[2]
+    allowed = int(target) == user_id if target else captcha_scheduler.is_pending(chat_id, user_id)
+    if not allowed:
         await callback.answer("Bu tugma siz uchun emas! / This button is not for you!", show_alert=True)
         return
         
@@ -87,8 +123,14 @@ async def on_captcha_solve(callback: types.CallbackQuery, bot: Bot):
     )
     
     try:
+        # Deadline stays scheduled until the user is actually unmuted
         await callback.message.chat.restrict(user_id, default_perms)
-        await callback.message.delete()
+        await captcha_scheduler.cancel(chat_id, user_id)
+        if captcha_scheduler.prompt_in_use(chat_id, callback.message.message_id):
+            # Others from the same batch still have to press it
+            await callback.answer("✅")
+        else:
+            await callback.message.delete()
         # await callback.answer("Welcome!") # Optional feedback
     except Exception as e:
         await callback.answer(f"Error: {e}")
@@ -1,21 +1,48 @@
-from aiogram import Router, types, F
+from aiogram import Router, types, F, Bot
 from aiogram.filters import Command
+from bot.handlers import owner_router
+from bot.services.broadcast import broadcaster, format_report
 from config import ADMIN_IDS
 
-owner_router = Router()
-
 @owner_router.message(Command("broadcast"), F.from_user.id.in_(ADMIN_IDS))
-async def cmd_broadcast(message: types.Message):
+async def cmd_broadcast(message: types.Message, bot: Bot):
     """
     Broadcast command for Bot Owner.
     Usage: /broadcast <text>
     """
-    args = message.text.split(" ", 1)
+    # html_text keeps the owner's formatting (bot parse mode is HTML)
+    args = message.html_text.split(" ", 1)
     if len(args) < 2:
         return await message.reply("Usage: /broadcast <message>")
-    
+
     markup_text = args[1]
-    
-    # In a real app, this would iterate over all users in DB
-    # For now, just echo confirmation
-    await message.reply(f"Started broadcast to generic users: {markup_text}\n(Note: DB iteration not implemented in prototype)")
+
+    broadcast_id = await broadcaster.start(bot, markup_text, message.chat.id)
+    await message.reply(
+        f"📢 Broadcast #{broadcast_id} started.\n"
+        f"/broadcast_status {broadcast_id}\n"
+        f"/broadcast_cancel {broadcast_id}"
+    )
+
+@owner_router.message(Command("broadcast_status"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_broadcast_status(message: types.Message):
+    args = message.text.split()
+    if len(args) < 2 or not args[1].isdigit():
+        active = ", ".join(f"#{i}" for i in broadcaster.active) or "-"
+        return await message.reply(f"Usage: /broadcast_status <id>\nRunning: {active}")
+
+    broadcast = await broadcaster.get(int(args[1]))
+    if broadcast is None:
+        return await message.reply("Broadcast not found")
+    await message.reply(format_report(broadcast))
+
+@owner_router.message(Command("broadcast_cancel"), F.from_user.id.in_(ADMIN_IDS))
+async def cmd_broadcast_cancel(message: types.Message):
+    args = message.text.split()
+    if len(args) < 2 or not args[1].isdigit():
+        return await message.reply("Usage: /broadcast_cancel <id>")
+
+    if await broadcaster.cancel(int(args[1])):
+        await message.reply(f"Broadcast #{args[1]} cancelled")
+    else:
+        await message.reply("Broadcast is not running")
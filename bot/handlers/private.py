@@ -23,6 +23,10 @@ async def cmd_start(message: types.Message, session, lang, bot: Bot):
             await session.commit()
         except:
             await session.rollback()
+    elif user.is_blocked:
+        # Reachable again, include in broadcasts
+        user.is_blocked = False
+        await session.commit()
             
     text = LocalizationService.get(lang, 'welcome')
     
@@ -39,7 +43,7 @@ async def cmd_start(message: types.Message, session, lang, bot: Bot):
     ])
     
     # Update URL to be dynamic if possible, or hardcode verified username
-    bot_user = await bot.get_me()
+    bot_user = await bot.me() # getMe once per process (preloaded by the startup warm-up)
     kb.inline_keyboard[0][0].url = f"https://t.me/{bot_user.username}?startgroup=true"
 
     await message.answer(text, reply_markup=kb)
@@ -12,6 +12,8 @@ STRINGS = {
         'link_detected': "Reklama havolalari taqiqlangan!",
         'forward_detected': "Uzatilgan xabarlar taqiqlangan!",
         'bad_word': "Haqoratli so'z ishlatmang!",
+        'duplicate_detected': "Bir xil xabarlarni takrorlamang!",
+        'raid_lockdown': "🛡 Guruhga hujum aniqlandi! Yangi a'zolar {minutes} daqiqaga cheklanadi.",
         'premium_only': "Bu funksiya faqat Premium guruhlar uchun! ✨",
         'slot_usage': "Sizning guruhlaringiz: {used}/{limit}.",
     },
@@ -26,6 +28,8 @@ STRINGS = {
         'link_detected': "Рекламные ссылки запрещены!",
         'forward_detected': "Пересланные сообщения запрещены!",
         'bad_word': "Не используйте оскорбительные слова!",
+        'duplicate_detected': "Не повторяйте одинаковые сообщения!",
+        'raid_lockdown': "🛡 Обнаружен рейд! Новые участники ограничены на {minutes} минут.",
         'premium_only': "Эта функция доступна только для Premium групп! ✨",
         'slot_usage': "Ваши группы: {used}/{limit}.",
     }
@@ -4,29 +4,106 @@ import os
 from aiogram import Bot, Dispatcher, types
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from bot.database.core import engine, Base
+from bot.database.core import engine, Base, sync_schema
 from bot.handlers import group_router, admin_router, private_router, owner_router, new_member_router
-from config import BOT_TOKEN
+from bot.services.user_writer import user_writer
+from bot.services.log_sink import log_sink
+from bot.services.log_rollup import log_rollup
+from bot.services.member_counts import member_counts
+from bot.services.activity import group_activity
+from bot.services.warmup import warmup
+from bot.services.admin_cache import admin_cache
+from bot.services.captcha_scheduler import captcha_scheduler
+from bot.services.outbox import outbox
+from bot.services.album_deleter import album_deleter
+from bot.services.broadcast import broadcaster
+from bot.services.settings_cache import settings_cache
+from bot.services.metrics import registry
+from bot.services.webhook import update_feeder
+from bot.services.sharding import shard
+from config import BOT_TOKEN, BOT_MODE, BOT_WORKERS, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS
 
-async def on_startup():
+async def init_db():
     # Create DB tables (Quick & Dirty for prototype)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(sync_schema)
+
+async def on_startup(bot: Bot):
+    # Shard workers start after the parent process prepared the schema
+    if not shard.sharded:
+        await init_db()
+
+    # Rate limited outgoing calls
+    outbox.start()
+
+    # Background writers
+    user_writer.start()
+    log_sink.start()
+    group_activity.start()
+
+    # Captcha deadlines survive restarts (each shard loads its own chats)
+    await captcha_scheduler.start(bot)
+    # Interrupted broadcasts continue from their last checkpoint, also after a shard crash
+    await broadcaster.resume(bot)
+
+    # Jobs that must run once per deployment
+    if shard.is_primary:
+        log_rollup.start()
+        member_counts.start(bot)
+
+    # Background, polling / the webhook feeder start right away
+    warmup.start(bot)
+
+async def on_shutdown():
+    await warmup.stop()
+    await broadcaster.stop()
+    await log_rollup.stop()
+    await member_counts.stop()
+    await captcha_scheduler.stop()
+    await album_deleter.stop()
+    await outbox.stop()
+
+    # Flush whatever is still buffered
+    await user_writer.stop()
+    await log_sink.stop()
+    await group_activity.stop()
 
 from bot.middlewares.db import DbSessionMiddleware
 from bot.middlewares.i18n import I18nMiddleware
+from bot.middlewares.raid import RaidGuardMiddleware
+from bot.middlewares.metrics import UpdateMetricsMiddleware, RequestMetricsMiddleware, instrument_router
 
-async def main():
-    logging.basicConfig(level=logging.INFO)
-    
+def create_bot() -> Bot:
     bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    bot.session.middleware(RequestMetricsMiddleware())
+    return bot
+
+def register_gauges():
+    registry.gauge("bot_outbox_depth", "Bot API calls waiting in the outbox", lambda: outbox.depth)
+    registry.gauge("bot_log_sink_depth", "Moderation log rows waiting to be written", lambda: log_sink.depth)
+    registry.gauge("bot_update_queue_depth", "Webhook updates waiting for a worker", lambda: update_feeder.depth)
+    registry.gauge("bot_album_deletes_pending", "Album items waiting for a batched delete", lambda: album_deleter.pending)
+    registry.gauge("bot_user_writer_pending", "User profiles waiting to be flushed", lambda: user_writer.pending)
+    registry.gauge("bot_captcha_pending", "Captcha deadlines scheduled", lambda: len(captcha_scheduler))
+    registry.gauge("bot_broadcasts_running", "Broadcasts in progress", lambda: len(broadcaster.active))
+    registry.gauge("bot_settings_cache_size", "Group settings held in the cache", lambda: len(settings_cache))
+    registry.counter_callback("bot_settings_cache_hits_total", "Settings cache hits since start", lambda: settings_cache.hits)
+    registry.counter_callback("bot_settings_cache_misses_total", "Settings cache misses since start", lambda: settings_cache.misses)
+    registry.counter_callback("bot_admin_cache_hits_total", "Admin cache hits since start", lambda: admin_cache.hits)
+    registry.counter_callback("bot_admin_cache_misses_total", "Admin cache misses since start", lambda: admin_cache.misses)
+    registry.gauge("bot_warmup_seconds", "Duration of the startup cache warm-up (0 while running)", lambda: warmup.elapsed or 0)
+    registry.gauge("bot_db_pool_checked_out", "DB connections in use", lambda: engine.pool.checkedout())
+
+def create_dispatcher() -> Dispatcher:
     dp = Dispatcher()
     
     # Global Middlewares
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
     dp.update.outer_middleware(DbSessionMiddleware())
+    dp.message.outer_middleware(RaidGuardMiddleware()) # Before any settings lookup
     dp.message.middleware(I18nMiddleware())
     dp.callback_query.middleware(I18nMiddleware())
-    dp.my_chat_member.middleware(DbSessionMiddleware())
     
     # Include routers
     dp.include_router(owner_router) # High priority
@@ -34,10 +111,61 @@ async def main():
     dp.include_router(private_router)
     dp.include_router(admin_router)
     dp.include_router(group_router)
+    for router in (owner_router, new_member_router, private_router, admin_router, group_router):
+        instrument_router(router)
+    register_gauges()
     
     dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+async def register_webhook(bot: Bot, allowed_updates):
+    if WEBHOOK_URL:
+        await bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=allowed_updates,
+            max_connections=WEBHOOK_MAX_CONNECTIONS
+        )
+        logging.info(f"Webhook set to {WEBHOOK_URL}{WEBHOOK_PATH}")
+    else:
+        logging.warning("WEBHOOK_URL is not set, expecting the webhook to be configured already")
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """
+    Updates arrive on WEBHOOK_PATH of the FastAPI app (see bot.api.server)
+    and are processed by update_feeder. Runs until cancelled.
+    """
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    update_feeder.start(bot, dp, **workflow_data)
+    try:
+        await register_webhook(bot, dp.resolve_used_update_types())
+        # Serve until the process stops
+        await asyncio.Event().wait()
+    finally:
+        # Webhook stays registered, Telegram keeps pending updates for the next start
+        await update_feeder.stop()
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    
+    if BOT_WORKERS > 1:
+        from bot.cluster import run_cluster
+        await run_cluster(BOT_WORKERS)
+        return
+
+    bot = create_bot()
+    dp = create_dispatcher()
     
-    await dp.start_polling(bot)
+    if BOT_MODE == 'webhook':
+        await run_webhook(bot, dp)
+    else:
+        # getUpdates does not work while a webhook is set
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 if __name__ == "__main__":
     try:
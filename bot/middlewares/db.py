@@ -1,8 +1,36 @@
-from typing import Callable, Dict, Any, Awaitable
+from typing import Callable, Dict, Any, Awaitable, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import AsyncSession
 from bot.database.core import async_session_maker
 
+class LazySession:
+    """
+    Stands in for AsyncSession. The real session (and its pooled connection)
+    is only created when a handler or middleware first uses it.
+    """
+    __slots__ = ('_session',)
+
+    def __init__(self):
+        self._session: Optional[AsyncSession] = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = async_session_maker()
+        return getattr(self._session, name)
+
+    def __bool__(self) -> bool:
+        return True
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
 class DbSessionMiddleware(BaseMiddleware):
     async def __call__(
         self,
@@ -10,6 +38,13 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        async with async_session_maker() as session:
-            data["session"] = session
+        # One session per update, even if registered on several observers
+        if "session" in data:
+            return await handler(event, data)
+
+        session = LazySession()
+        data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            await session.close()
@@ -1,8 +1,7 @@
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject, Message, CallbackQuery
-from sqlalchemy import select
-from bot.database.models import User, GroupSettings
+from bot.services.repository import Repository
 
 class I18nMiddleware(BaseMiddleware):
     async def __call__(
@@ -26,11 +25,10 @@ class I18nMiddleware(BaseMiddleware):
         chat = data.get("event_chat")
         
         if chat and chat.type in ['group', 'supergroup']:
-            stmt = select(GroupSettings).where(GroupSettings.group_id == chat.id)
-            result = await session.execute(stmt)
-            settings = result.scalar_one_or_none()
-            if settings:
-                lang = settings.language
+            # Resolved once per update and handed to handlers as `group_settings`
+            settings = await Repository(session).get_group_settings(chat.id)
+            data["group_settings"] = settings
+            lang = settings.language
         elif user:
             # Check user prefs (cached or db)
             # For prototype, we default to 'uz' or simple check
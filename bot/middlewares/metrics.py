@@ -0,0 +1,80 @@
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramConflictError, TelegramForbiddenError, TelegramNetworkError,
+    TelegramNotFound, TelegramRetryAfter, TelegramServerError, TelegramUnauthorizedError,
+)
+from aiogram.types import TelegramObject, Update
+from bot.services.metrics import (
+    updates_total, update_seconds, handler_seconds, handler_errors_total,
+    telegram_request_seconds, telegram_errors_total,
+)
+
+ERROR_CODES = {
+    TelegramBadRequest: "400",
+    TelegramUnauthorizedError: "401",
+    TelegramForbiddenError: "403",
+    TelegramNotFound: "404",
+    TelegramConflictError: "409",
+    TelegramRetryAfter: "429",
+    TelegramServerError: "5xx",
+    TelegramNetworkError: "network",
+}
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer middleware on dp.update: throughput and total time per update type"""
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        kind = event.event_type if isinstance(event, Update) else type(event).__name__
+        updates_total.inc(kind)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_seconds.observe(time.perf_counter() - started, kind)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner middleware, only runs when a handler of its router matched"""
+    def __init__(self, router: str, event: str):
+        self.labels = (router, event)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors_total.inc(*self.labels)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, *self.labels)
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: latency and error codes per Bot API method"""
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            code = next((c for cls, c in ERROR_CODES.items() if isinstance(e, cls)), "other")
+            telegram_errors_total.inc(name, code)
+            raise
+        finally:
+            telegram_request_seconds.observe(time.perf_counter() - started, name)
+
+def instrument_router(router):
+    for event, observer in router.observers.items():
+        if event in ("update", "error"):
+            continue
+        observer.middleware(HandlerMetricsMiddleware(router.name, event))
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Callable, Dict, Any, Awaitable, Set
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Message
+from bot.services.raid import raid_guard
+from bot.services.outbox import outbox
+
+# Pending deletes, referenced until done so they are not garbage collected
+_deleting: Set[asyncio.Task] = set()
+
+class RaidGuardMiddleware(BaseMiddleware):
+    """
+    Drops messages from users who joined during a raid lockdown.
+    Runs as an outer middleware, before settings or admin lookups.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Message) and event.from_user and event.chat.type in ['group', 'supergroup']:
+            if raid_guard.is_raider(event.chat.id, event.from_user.id):
+                task = asyncio.create_task(self._delete(event))
+                _deleting.add(task)
+                task.add_done_callback(_deleting.discard)
+                return None
+        return await handler(event, data)
+
+    @staticmethod
+    async def _delete(message: Message):
+        try:
+            await outbox.call(message.chat.id, message.delete)
+        except Exception:
+            pass
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Set
+from sqlalchemy import update
+from bot.database.core import async_session_maker
+from bot.database.models import Group
+from config import ACTIVITY_FLUSH_INTERVAL
+
+# Group ids per UPDATE statement
+FLUSH_CHUNK = 1000
+
+class GroupActivity:
+    """
+    Keeps Group.last_active_at roughly current without a write per message.
+    touch() only remembers the group, every `flush_interval` seconds all
+    groups seen since the last flush are stamped with one UPDATE.
+    """
+
+    def __init__(self, flush_interval: float = ACTIVITY_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._seen: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._seen)
+
+    def touch(self, group_id: int):
+        self._seen.add(group_id)
+
+    async def flush(self):
+        if not self._seen:
+            return
+
+        batch, self._seen = self._seen, set()
+        group_ids = list(batch)
+        now = datetime.utcnow()
+        try:
+            async with async_session_maker() as session:
+                for i in range(0, len(group_ids), FLUSH_CHUNK):
+                    await session.execute(
+                        update(Group).where(Group.id.in_(group_ids[i:i + FLUSH_CHUNK])).values(last_active_at=now)
+                    )
+                await session.commit()
+        except asyncio.CancelledError:
+            self._seen |= batch
+            raise
+        except Exception as e:
+            logging.error(f"Group activity flush failed ({len(group_ids)} groups): {e}")
+            self._seen |= batch
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+group_activity = GroupActivity()
@@ -0,0 +1,101 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from aiogram import Bot
+from aiogram.enums import ChatMemberStatus
+from config import ADMIN_CACHE_TTL, ADMIN_CACHE_SIZE, ADMIN_CACHE_RETRY
+
+ADMIN_STATUSES = {ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR}
+
+class AdminCache:
+    """
+    Per-chat set of administrator ids.
+    Loaded once with get_chat_administrators, patched from chat_member /
+    my_chat_member updates and reloaded after the TTL expires.
+    A failed load keeps the stale set (or None, "unknown") for `retry_after`
+    seconds, so an API outage costs one call per chat and not one per message.
+    """
+
+    def __init__(self, ttl: float = ADMIN_CACHE_TTL, max_chats: int = ADMIN_CACHE_SIZE, retry_after: float = ADMIN_CACHE_RETRY):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self.retry_after = retry_after
+        # chat_id -> (expires_at, admin ids or None when unknown)
+        self._admins: "OrderedDict[int, Tuple[float, Optional[Set[int]]]]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def is_admin(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        """For admin commands: False while the admin list is unknown"""
+        admins = await self.get_admins(bot, chat_id)
+        return admins is not None and user_id in admins
+
+    async def is_exempt(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        """For moderation: admins, and everyone while the admin list is unknown"""
+        admins = await self.get_admins(bot, chat_id)
+        return admins is None or user_id in admins
+
+    async def get_admins(self, bot: Bot, chat_id: int) -> Optional[Set[int]]:
+        """Admin ids of the chat, None if they could not be loaded"""
+        entry = self._admins.get(chat_id)
+        if entry and entry[0] > time.monotonic():
+            self._admins.move_to_end(chat_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        # One loader per chat, concurrent messages wait for it
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            entry = self._admins.get(chat_id)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+
+            try:
+                members = await bot.get_chat_administrators(chat_id)
+            except Exception as e:
+                logging.error(f"Failed to load admins of {chat_id}: {e}")
+                # Keep serving the stale set (or "unknown") rather than moderating admins
+                admins = entry[1] if entry else None
+                self._store(chat_id, admins, self.retry_after)
+            else:
+                admins = {m.user.id for m in members}
+                self._store(chat_id, admins, self.ttl)
+
+            # Only now: new arrivals hit the stored entry, waiters on this lock re-check it
+            if self._locks.get(chat_id) is lock:
+                del self._locks[chat_id]
+            return admins
+
+    def update_member(self, chat_id: int, user_id: int, status: str):
+        """Apply a chat_member / my_chat_member status change to a loaded chat"""
+        entry = self._admins.get(chat_id)
+        if not entry or entry[1] is None:
+            return
+
+        if status in ADMIN_STATUSES:
+            entry[1].add(user_id)
+        else:
+            entry[1].discard(user_id)
+
+    def store(self, chat_id: int, admins: Set[int]):
+        """Admin ids loaded elsewhere (startup warm-up)"""
+        self._store(chat_id, admins, self.ttl)
+
+    def loaded(self, chat_id: int) -> bool:
+        entry = self._admins.get(chat_id)
+        return bool(entry) and entry[1] is not None and entry[0] > time.monotonic()
+
+    def invalidate(self, chat_id: int):
+        self._admins.pop(chat_id, None)
+
+    def _store(self, chat_id: int, admins: Optional[Set[int]], ttl: float):
+        self._admins[chat_id] = (time.monotonic() + ttl, admins)
+        self._admins.move_to_end(chat_id)
+        while len(self._admins) > self.max_chats:
+            self._admins.popitem(last=False)
+
+admin_cache = AdminCache()
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Dict, List, Set, Tuple
+from aiogram import Bot
+from bot.services.outbox import outbox
+from config import ALBUM_DELETE_DELAY
+
+# Bot API limit for deleteMessages
+MAX_BATCH = 100
+
+class AlbumDeleter:
+    """
+    Batches deletes of album items. Telegram delivers an album as one update
+    per item with the same media_group_id, so the first item starts a short
+    timer and all items seen until then are removed with one deleteMessages
+    call through the outbox. Callers do not wait for the delete, so the next
+    item of the album is not held up behind it.
+    """
+
+    def __init__(self, delay: float = ALBUM_DELETE_DELAY):
+        self.delay = delay
+        # (chat_id, media_group_id) -> message ids
+        self._pending: Dict[Tuple[int, str], List[int]] = {}
+        self._bots: Dict[Tuple[int, str], Bot] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Task] = {}
+        # Full batches sent early, referenced until done
+        self._sending: Set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(ids) for ids in self._pending.values())
+
+    def delete(self, bot: Bot, chat_id: int, media_group_id: str, message_id: int):
+        key = (chat_id, media_group_id)
+        ids = self._pending.get(key)
+        if ids is not None:
+            ids.append(message_id)
+            if len(ids) >= MAX_BATCH:
+                self._tasks.pop(key).cancel()
+                task = asyncio.create_task(self._send(self._bots.pop(key), key, self._pending.pop(key)))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+            return
+        self._pending[key] = [message_id]
+        self._bots[key] = bot
+        self._tasks[key] = asyncio.create_task(self._flush_later(key))
+
+    async def _flush_later(self, key: Tuple[int, str]):
+        await asyncio.sleep(self.delay)
+        self._tasks.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple[int, str]):
+        ids = self._pending.pop(key, None)
+        bot = self._bots.pop(key, None)
+        if ids:
+            await self._send(bot, key, ids)
+
+    async def _send(self, bot: Bot, key: Tuple[int, str], ids: List[int]):
+        chat_id = key[0]
+        try:
+            await outbox.call(chat_id, lambda: bot.delete_messages(chat_id, ids))
+        except Exception as e:
+            logging.error(f"Failed to delete album {key[1]} in {chat_id} ({len(ids)} messages): {e}")
+
+    async def stop(self):
+        """Delete everything still waiting for its timer"""
+        tasks, self._tasks = list(self._tasks.values()), {}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(self._flush(key) for key in list(self._pending)), *self._sending)
+
+album_deleter = AlbumDeleter()
@@ -0,0 +1,282 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from sqlalchemy import select, update, or_
+from bot.database.core import async_session_maker
+from bot.database.models import User, Broadcast
+from bot.services.outbox import outbox, PRIORITY_BACKGROUND
+from bot.services.sharding import shard
+from config import BROADCAST_WORKERS, BROADCAST_PAGE_SIZE, BROADCAST_LEASE
+
+SENT, FAILED, BLOCKED = 'sent', 'failed', 'blocked'
+MAX_RETRIES = 3
+
+class Broadcaster:
+    """
+    Sends one text to every reachable user.
+
+    Recipients are read page by page with keyset pagination (id > cursor), the
+    next page is fetched while the current one is being sent. A pool of
+    workers sends each page through the outbox at the lowest priority, so
+    broadcasts only get the part of Telegram's global limit that moderation
+    actions and notices leave over.
+    After each page the cursor, counters and newly blocked users are stored,
+    so an interrupted broadcast resumes after the last finished page.
+    A process only sends a broadcast while it holds its lease (renewed on every
+    checkpoint). Expired leases are claimed with one conditional UPDATE, so with
+    several processes each broadcast still has exactly one sender.
+    """
+
+    def __init__(self, workers: int = BROADCAST_WORKERS, page_size: int = BROADCAST_PAGE_SIZE, lease: int = BROADCAST_LEASE):
+        self.workers = workers
+        self.page_size = page_size
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> List[int]:
+        return list(self._tasks)
+
+    async def start(self, bot: Bot, text: str, report_chat_id: int) -> int:
+        async with async_session_maker() as session:
+            broadcast = Broadcast(
+                text=text, report_chat_id=report_chat_id, status='running', last_user_id=0,
+                owner=self.owner, lease_until=self._lease_end()
+            )
+            session.add(broadcast)
+            await session.commit()
+            broadcast_id = broadcast.id
+        self._launch(bot, broadcast_id)
+        return broadcast_id
+
+    async def resume(self, bot: Bot):
+        """
+        Continue broadcasts interrupted by a restart, then keep taking over
+        broadcasts whose sender stopped renewing its lease. A broadcast belongs
+        to the shard that owns its report chat (where /broadcast was sent).
+        """
+        await self._claim_stale(bot)
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch(bot))
+
+    async def _watch(self, bot: Bot):
+        while True:
+            await asyncio.sleep(self.lease)
+            try:
+                await self._claim_stale(bot)
+            except Exception as e:
+                logging.error(f"Broadcast lease check failed: {e}")
+
+    async def _claim_stale(self, bot: Bot):
+        now = datetime.utcnow()
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(Broadcast.id, Broadcast.report_chat_id).where(
+                    Broadcast.status == 'running',
+                    or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < now)
+                )
+            )
+            rows = result.all()
+        for broadcast_id, report_chat_id in rows:
+            if broadcast_id in self._tasks or not shard.owns(report_chat_id or 0):
+                continue
+            if not await self._claim(broadcast_id, now):
+                # Another process got it first
+                continue
+            logging.info(f"Resuming broadcast #{broadcast_id}")
+            self._launch(bot, broadcast_id)
+
+    async def _claim(self, broadcast_id: int, now: datetime) -> bool:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status == 'running',
+                    or_(Broadcast.lease_until.is_(None), Broadcast.lease_until < now)
+                )
+                .values(owner=self.owner, lease_until=self._lease_end())
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    def _lease_end(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease)
+
+    async def cancel(self, broadcast_id: int) -> bool:
+        task = self._tasks.pop(broadcast_id, None)
+        if task is not None:
+            task.cancel()
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == 'running')
+                .values(status='cancelled', finished_at=datetime.utcnow())
+            )
+            await session.commit()
+        return task is not None or result.rowcount > 0
+
+    async def get(self, broadcast_id: int) -> Optional[Broadcast]:
+        async with async_session_maker() as session:
+            return await session.get(Broadcast, broadcast_id)
+
+    def _launch(self, bot: Bot, broadcast_id: int):
+        if broadcast_id not in self._tasks:
+            self._tasks[broadcast_id] = asyncio.create_task(self._run(bot, broadcast_id))
+
+    async def _run(self, bot: Bot, broadcast_id: int):
+        try:
+            broadcast = await self.get(broadcast_id)
+            if broadcast is None or broadcast.status != 'running':
+                return
+
+            page = await self._fetch(broadcast.last_user_id or 0)
+            while page:
+                started = time.monotonic()
+                prefetch = asyncio.create_task(self._fetch(page[-1]))
+                try:
+                    counts, blocked_ids = await self._send_page(bot, broadcast.text, page)
+                except BaseException:
+                    prefetch.cancel()
+                    raise
+                if not await self._checkpoint(broadcast_id, page[-1], counts, blocked_ids, time.monotonic() - started):
+                    # Cancelled (possibly from another process) or taken over
+                    prefetch.cancel()
+                    return
+                page = await prefetch
+
+            await self._finish(bot, broadcast_id)
+        except asyncio.CancelledError:
+            # Shutdown or /broadcast_cancel, the last checkpoint stays
+            raise
+        except Exception as e:
+            logging.error(f"Broadcast #{broadcast_id} stopped: {e}")
+        finally:
+            self._tasks.pop(broadcast_id, None)
+
+    async def _fetch(self, after_id: int) -> List[int]:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(User.id)
+                .where(User.id > after_id, User.is_blocked.is_not(True))
+                .order_by(User.id)
+                .limit(self.page_size)
+            )
+            return result.scalars().all()
+
+    async def _send_page(self, bot: Bot, text: str, user_ids: List[int]) -> Tuple[Dict[str, int], List[int]]:
+        queue: Deque[int] = deque(user_ids)
+        counts = {SENT: 0, FAILED: 0, BLOCKED: 0}
+        blocked_ids: List[int] = []
+
+        async def worker():
+            while queue:
+                user_id = queue.popleft()
+                outcome = await self._deliver(bot, user_id, text)
+                counts[outcome] += 1
+                if outcome == BLOCKED:
+                    blocked_ids.append(user_id)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.workers, len(user_ids)))]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+        return counts, blocked_ids
+
+    async def _deliver(self, bot: Bot, user_id: int, text: str) -> str:
+        for _ in range(MAX_RETRIES + 1):
+            try:
+                await outbox.call(user_id, lambda: bot.send_message(user_id, text), priority=PRIORITY_BACKGROUND)
+                return SENT
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TelegramForbiddenError:
+                # Blocked the bot, deactivated, or never started it
+                return BLOCKED
+            except TelegramBadRequest as e:
+                if "chat not found" in str(e).lower():
+                    return BLOCKED
+                return FAILED
+            except Exception as e:
+                logging.error(f"Broadcast to {user_id} failed: {e}")
+                return FAILED
+        return FAILED
+
+    async def _checkpoint(self, broadcast_id: int, cursor: int, counts: Dict[str, int], blocked_ids: List[int], elapsed: float) -> bool:
+        """Store progress and renew the lease, False if the broadcast is no longer running here"""
+        async with async_session_maker() as session:
+            result = await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status == 'running', Broadcast.owner == self.owner)
+                .values(
+                    lease_until=self._lease_end(),
+                    last_user_id=cursor,
+                    sent=Broadcast.sent + counts[SENT],
+                    failed=Broadcast.failed + counts[FAILED],
+                    blocked=Broadcast.blocked + counts[BLOCKED],
+                    elapsed=Broadcast.elapsed + int(round(elapsed)),
+                )
+            )
+            if blocked_ids:
+                await session.execute(update(User).where(User.id.in_(blocked_ids)).values(is_blocked=True))
+            await session.commit()
+        return result.rowcount > 0
+
+    async def _finish(self, bot: Bot, broadcast_id: int):
+        async with async_session_maker() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+            broadcast.status = 'done'
+            broadcast.finished_at = datetime.utcnow()
+            await session.commit()
+        logging.info(f"Broadcast #{broadcast_id} done: sent {broadcast.sent}, failed {broadcast.failed}, blocked {broadcast.blocked}")
+        if broadcast.report_chat_id:
+            outbox.notify(bot, broadcast.report_chat_id, format_report(broadcast))
+
+    async def stop(self):
+        """Interrupt running broadcasts and release their leases, they resume on next start"""
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        broadcast_ids = list(self._tasks)
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        if broadcast_ids:
+            try:
+                async with async_session_maker() as session:
+                    await session.execute(
+                        update(Broadcast)
+                        .where(Broadcast.id.in_(broadcast_ids), Broadcast.owner == self.owner)
+                        .values(lease_until=None)
+                    )
+                    await session.commit()
+            except Exception as e:
+                logging.error(f"Failed to release broadcast leases: {e}")
+
+def format_report(broadcast: Broadcast) -> str:
+    elapsed = broadcast.elapsed or 0
+    rate = broadcast.sent / elapsed if elapsed else float(broadcast.sent)
+    return (
+        f"📢 Broadcast #{broadcast.id}: {broadcast.status}\n"
+        f"Sent: {broadcast.sent}\n"
+        f"Failed: {broadcast.failed}\n"
+        f"Blocked: {broadcast.blocked}\n"
+        f"Time: {elapsed}s ({rate:.1f} msg/s)"
+    )
+
+broadcaster = Broadcaster()
@@ -0,0 +1,207 @@
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from aiogram import Bot
+from sqlalchemy import select, delete, update, tuple_
+from bot.database.core import async_session_maker, upsert
+from bot.database.models import CaptchaDeadline
+from bot.services.outbox import outbox
+from bot.services.sharding import shard
+
+Key = Tuple[int, int] # (chat_id, user_id)
+
+class CaptchaScheduler:
+    """
+    Single background loop for all captcha timeouts.
+
+    Deadlines live in a heap plus a dict index. Cancelling just drops the dict
+    entry (O(1)); stale heap entries are skipped when they reach the top.
+    Every deadline is also stored in `captcha_deadlines` and reloaded on start,
+    so restarts do not leave users muted forever.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, Key]] = []
+        self._pending: Dict[Key, Tuple[datetime, Optional[int]]] = {}
+        # (chat_id, message_id) -> users still waiting on that prompt
+        self._prompt_users: Dict[Key, int] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._expiring: Set[asyncio.Task] = set()
+        self._bot: Optional[Bot] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def is_pending(self, chat_id: int, user_id: int) -> bool:
+        return (chat_id, user_id) in self._pending
+
+    def prompt_in_use(self, chat_id: int, message_id: Optional[int]) -> bool:
+        """True while other users still have to solve the (shared) prompt message"""
+        return (chat_id, message_id) in self._prompt_users
+
+    async def schedule(self, chat_id: int, user_id: int, message_id: Optional[int], timeout: int):
+        await self.schedule_many(chat_id, [user_id], message_id, timeout)
+
+    async def schedule_many(self, chat_id: int, user_ids: Iterable[int], message_id: Optional[int], timeout: int):
+        deadline = datetime.utcnow() + timedelta(seconds=timeout)
+        rows = []
+        for user_id in user_ids:
+            self._push((chat_id, user_id), deadline, message_id)
+            rows.append({"chat_id": chat_id, "user_id": user_id, "message_id": message_id, "deadline": deadline})
+        if not rows:
+            return
+
+        async with async_session_maker() as session:
+            stmt = upsert(CaptchaDeadline).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CaptchaDeadline.chat_id, CaptchaDeadline.user_id],
+                set_={"message_id": stmt.excluded.message_id, "deadline": stmt.excluded.deadline}
+            )
+            await session.execute(stmt)
+            await session.commit()
+
+    async def attach_prompt(self, chat_id: int, user_ids: Iterable[int], message_id: int):
+        """Point already scheduled deadlines at the captcha message sent after them"""
+        keys = []
+        for user_id in user_ids:
+            key = (chat_id, user_id)
+            entry = self._pending.get(key)
+            if entry is None:
+                # Solved or expired meanwhile
+                continue
+            self._release(chat_id, entry[1])
+            self._pending[key] = (entry[0], message_id)
+            self._hold(chat_id, message_id)
+            keys.append(key)
+        if not keys:
+            return
+
+        async with async_session_maker() as session:
+            await session.execute(
+                update(CaptchaDeadline)
+                .where(tuple_(CaptchaDeadline.chat_id, CaptchaDeadline.user_id).in_(keys))
+                .values(message_id=message_id)
+            )
+            await session.commit()
+
+    async def cancel(self, chat_id: int, user_id: int) -> Optional[int]:
+        """Drop the deadline. Returns its captcha message id, None if nothing was pending."""
+        entry = self._pending.pop((chat_id, user_id), None)
+        if entry is None:
+            return None
+        self._release(chat_id, entry[1])
+        await self._forget([(chat_id, user_id)])
+        return entry[1]
+
+    def _push(self, key: Key, deadline: datetime, message_id: Optional[int]):
+        previous = self._pending.get(key)
+        if previous is not None:
+            self._release(key[0], previous[1])
+        self._pending[key] = (deadline, message_id)
+        self._hold(key[0], message_id)
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0][1] == key:
+            # New earliest deadline, re-arm the loop
+            self._wakeup.set()
+
+    def _hold(self, chat_id: int, message_id: Optional[int]):
+        if message_id is not None:
+            prompt = (chat_id, message_id)
+            self._prompt_users[prompt] = self._prompt_users.get(prompt, 0) + 1
+
+    def _release(self, chat_id: int, message_id: Optional[int]):
+        prompt = (chat_id, message_id)
+        left = self._prompt_users.get(prompt, 0) - 1
+        if left > 0:
+            self._prompt_users[prompt] = left
+        else:
+            self._prompt_users.pop(prompt, None)
+
+    async def _forget(self, keys: List[Key], deadline: Optional[datetime] = None):
+        """Delete stored deadlines, only those still equal to `deadline` when given"""
+        stmt = delete(CaptchaDeadline).where(tuple_(CaptchaDeadline.chat_id, CaptchaDeadline.user_id).in_(keys))
+        if deadline is not None:
+            # A rejoin may have rescheduled the same (chat, user) meanwhile
+            stmt = stmt.where(CaptchaDeadline.deadline == deadline)
+        try:
+            async with async_session_maker() as session:
+                await session.execute(stmt)
+                await session.commit()
+        except Exception as e:
+            logging.error(f"Failed to delete captcha deadlines: {e}")
+
+    async def load(self):
+        async with async_session_maker() as session:
+            result = await session.execute(select(CaptchaDeadline))
+            for row in result.scalars():
+                # Sharded mode: every worker handles the chats it owns
+                if shard.owns(row.chat_id):
+                    self._push((row.chat_id, row.user_id), row.deadline, row.message_id)
+        logging.info(f"Loaded {len(self._pending)} captcha deadlines")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            while self._heap:
+                deadline, key = self._heap[0]
+                entry = self._pending.get(key)
+                if entry is None or entry[0] != deadline:
+                    # Cancelled or rescheduled
+                    heapq.heappop(self._heap)
+                    continue
+
+                delay = (deadline - datetime.utcnow()).total_seconds()
+                if delay > 0:
+                    timeout = delay
+                    break
+
+                heapq.heappop(self._heap)
+                del self._pending[key]
+                self._release(key[0], entry[1])
+                task = asyncio.create_task(self._expire(key[0], key[1], entry[1], deadline))
+                self._expiring.add(task)
+                task.add_done_callback(self._expiring.discard)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _expire(self, chat_id: int, user_id: int, message_id: Optional[int], deadline: datetime):
+        bot = self._bot
+        try:
+            # Check member status
+            member = await outbox.call(chat_id, lambda: bot.get_chat_member(chat_id, user_id))
+            if member.status == 'restricted' and not member.can_send_messages:
+                # Still restricted -> Kick
+                await outbox.call(chat_id, lambda: bot.ban_chat_member(chat_id, user_id))
+                await outbox.call(chat_id, lambda: bot.unban_chat_member(chat_id, user_id)) # Kick (unban allows rejoin)
+            # Shared prompt goes away with its last user
+            if message_id and not self.prompt_in_use(chat_id, message_id):
+                await outbox.call(chat_id, lambda: bot.delete_message(chat_id, message_id))
+        except Exception as e:
+            logging.error(f"Captcha timeout of {user_id} in {chat_id} failed: {e}")
+        finally:
+            await self._forget([(chat_id, user_id)], deadline)
+
+    async def start(self, bot: Bot):
+        self._bot = bot
+        if self._task is None:
+            await self.load()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Deadlines are persisted, nothing to flush
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+captcha_scheduler = CaptchaScheduler()
@@ -0,0 +1,91 @@
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Tuple
+from bot.services.word_filter import normalize
+from config import DUPLICATE_WINDOW, DUPLICATE_GROUP_LIMIT, DUPLICATE_MAX_ENTRIES, DUPLICATE_MIN_LENGTH
+
+NON_WORD_REGEX = re.compile(r'[\W_]+')
+
+def fingerprint_key(text: str, skeleton: str = None) -> str:
+    """The text with case, spacing, punctuation and homoglyphs folded away ('' for emoji / punctuation only)"""
+    if skeleton is None:
+        _, skeleton = normalize(text)
+    return NON_WORD_REGEX.sub('', skeleton)
+
+class _GroupWindow:
+    __slots__ = ('entries', 'by_text', 'by_user')
+
+    def __init__(self):
+        self.entries: Deque[Tuple[float, int, int]] = deque() # (time, fingerprint, user_id)
+        self.by_text: Dict[int, int] = {}
+        self.by_user: Dict[Tuple[int, int], int] = {}
+
+    def push(self, now: float, fp: int, user_id: int):
+        self.entries.append((now, fp, user_id))
+        self.by_text[fp] = self.by_text.get(fp, 0) + 1
+        self.by_user[(fp, user_id)] = self.by_user.get((fp, user_id), 0) + 1
+
+    def pop(self):
+        _, fp, user_id = self.entries.popleft()
+        for counter, key in ((self.by_text, fp), (self.by_user, (fp, user_id))):
+            left = counter[key] - 1
+            if left:
+                counter[key] = left
+            else:
+                del counter[key]
+
+class DuplicateDetector:
+    """
+    Per-group rolling window of message fingerprints.
+
+    A message is a duplicate when the same user already sent it within `window`
+    seconds, or when `group_limit` copies were posted by anyone. Each group keeps
+    at most `max_entries` fingerprints, so memory is fixed and every check is O(1).
+    """
+
+    def __init__(
+        self,
+        window: float = DUPLICATE_WINDOW,
+        group_limit: int = DUPLICATE_GROUP_LIMIT,
+        max_entries: int = DUPLICATE_MAX_ENTRIES,
+        min_length: int = DUPLICATE_MIN_LENGTH,
+        max_groups: int = 10000
+    ):
+        self.window = window
+        self.group_limit = group_limit
+        self.max_entries = max_entries
+        self.min_length = min_length
+        self.max_groups = max_groups
+        self._groups: "OrderedDict[int, _GroupWindow]" = OrderedDict()
+
+    def check(self, group_id: int, user_id: int, text: str, skeleton: str = None) -> bool:
+        """Record the message and return True if it is a duplicate. `skeleton` skips normalizing again."""
+        if not text:
+            return False
+        # Measured after folding: emoji or punctuation only messages all fold to '' and are never duplicates
+        key = fingerprint_key(text, skeleton)
+        if not key or len(key) < self.min_length:
+            return False
+
+        now = time.monotonic()
+        group = self._groups.get(group_id)
+        if group is None:
+            group = self._groups[group_id] = _GroupWindow()
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+        self._groups.move_to_end(group_id)
+
+        # Expire old entries and keep the fixed budget
+        while group.entries and (group.entries[0][0] <= now - self.window or len(group.entries) >= self.max_entries):
+            group.pop()
+
+        fp = hash(key)
+        is_duplicate = (
+            group.by_user.get((fp, user_id), 0) >= 1
+            or group.by_text.get(fp, 0) + 1 >= self.group_limit
+        )
+        group.push(now, fp, user_id)
+        return is_duplicate
+
+duplicate_detector = DuplicateDetector()
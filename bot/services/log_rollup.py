@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, delete, func
+from bot.database.core import async_session_maker, upsert
+from bot.database.models import ModerationLog, ModerationDailyStat, RollupState
+from config import ROLLUP_INTERVAL, ROLLUP_LAG, ROLLUP_BATCH, LOG_RETENTION_DAYS, LOG_PURGE_BATCH
+
+STATE_NAME = 'moderation_daily_stats'
+
+class LogRollup:
+    """
+    Periodic job that folds moderation_logs into moderation_daily_stats.
+
+    Logs are consumed in id order from a stored high-water mark. Each batch
+    adds its per (group, day, action) counts and moves the mark in the same
+    transaction, holding a row lock on the mark, so every row is counted
+    exactly once even with several runners. Rows newer than `lag`
+    seconds are left for the next run, inserts that are still in flight
+    cannot slip below the mark.
+    Raw rows older than `retention_days` that were already counted are then
+    deleted in small batches.
+    """
+
+    def __init__(
+        self,
+        interval: float = ROLLUP_INTERVAL,
+        lag: int = ROLLUP_LAG,
+        batch_size: int = ROLLUP_BATCH,
+        retention_days: int = LOG_RETENTION_DAYS,
+        purge_batch: int = LOG_PURGE_BATCH
+    ):
+        self.interval = interval
+        self.lag = lag
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.purge_batch = purge_batch
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Roll up everything eligible, returns the number of log ids covered"""
+        covered = 0
+        while True:
+            done = await self._rollup_batch()
+            if not done:
+                return covered
+            covered += done
+
+    async def _rollup_batch(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lag)
+        async with async_session_maker() as session:
+            # Row lock on the mark: a concurrent runner waits here
+            # and then see the moved mark instead of counting the same range twice
+            state = await session.get(RollupState, STATE_NAME, with_for_update=True)
+            if state is None:
+                await session.execute(
+                    upsert(RollupState).values(name=STATE_NAME, last_id=0)
+                    .on_conflict_do_nothing(index_elements=[RollupState.name])
+                )
+                state = await session.get(RollupState, STATE_NAME, with_for_update=True)
+            low = state.last_id or 0
+
+            # Next `batch_size` ids, but never past the first row that is still too fresh
+            batch = (
+                select(ModerationLog.id).where(ModerationLog.id > low)
+                .order_by(ModerationLog.id).limit(self.batch_size).subquery()
+            )
+            high = await session.scalar(select(func.max(batch.c.id)))
+            fresh = await session.scalar(
+                select(func.min(ModerationLog.id)).where(ModerationLog.id > low, ModerationLog.timestamp >= cutoff)
+            )
+            if high is not None and fresh is not None:
+                high = min(high, fresh - 1)
+            if high is None or high <= low:
+                return 0
+
+            day = func.date(ModerationLog.timestamp)
+            result = await session.execute(
+                select(ModerationLog.group_id, day, ModerationLog.action, func.count())
+                .where(ModerationLog.id > low, ModerationLog.id <= high)
+                .group_by(ModerationLog.group_id, day, ModerationLog.action)
+            )
+            rows = [
+                {
+                    "group_id": group_id,
+                    # SQLite returns date() as text
+                    "day": date.fromisoformat(d) if isinstance(d, str) else d,
+                    "action": action or 'unknown',
+                    "count": count,
+                }
+                for group_id, d, action, count in result.all()
+                if group_id is not None and d is not None
+            ]
+            if rows:
+                stmt = upsert(ModerationDailyStat).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[ModerationDailyStat.group_id, ModerationDailyStat.day, ModerationDailyStat.action],
+                    set_={"count": ModerationDailyStat.count + stmt.excluded.count}
+                )
+                await session.execute(stmt)
+
+            state.last_id = high
+            state.updated_at = datetime.utcnow()
+            await session.commit()
+            return high - low
+
+    async def purge(self) -> int:
+        """Delete counted raw logs past retention, one small batch per transaction"""
+        if self.retention_days <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        purged = 0
+        while True:
+            async with async_session_maker() as session:
+                state = await session.get(RollupState, STATE_NAME)
+                if state is None:
+                    return purged
+                ids = select(ModerationLog.id).where(
+                    ModerationLog.timestamp < cutoff,
+                    ModerationLog.id <= state.last_id
+                ).order_by(ModerationLog.id).limit(self.purge_batch)
+                result = await session.execute(delete(ModerationLog).where(ModerationLog.id.in_(ids)))
+                await session.commit()
+            purged += result.rowcount
+            if result.rowcount < self.purge_batch:
+                return purged
+            # Let other queries through between batches
+            await asyncio.sleep(0.1)
+
+    async def _run(self):
+        while True:
+            try:
+                rolled = await self.run_once()
+                purged = await self.purge()
+                if rolled or purged:
+                    logging.info(f"Log rollup: {rolled} ids rolled up, {purged} old rows purged")
+            except Exception as e:
+                logging.error(f"Log rollup failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+log_rollup = LogRollup()
@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import insert
+from bot.database.core import async_session_maker
+from bot.database.models import ModerationLog
+from config import LOG_QUEUE_SIZE, LOG_BATCH_SIZE, LOG_FLUSH_INTERVAL
+
+class ModerationLogSink:
+    """
+    Asynchronous writer for ModerationLog rows.
+
+    submit() only puts the row on a bounded queue (waiting when it is full), a
+    background task drains it with multi-row INSERTs once `batch_size` rows are
+    collected or `flush_interval` seconds passed since the first one.
+    stop() drains the queue before returning.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = LOG_QUEUE_SIZE,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def submit(self, group_id: int, user_id: int, action: str, reason: str = None):
+        row = {
+            "group_id": group_id,
+            "user_id": user_id,
+            "action": action,
+            "reason": reason,
+            "timestamp": datetime.utcnow(),
+        }
+        if self._task is None:
+            # Not running (API process, scripts) -> write synchronously
+            await self._write([row])
+            return
+        # Backpressure: waits while the queue is full
+        await self._queue.put(row)
+
+    async def _write(self, rows: List[dict]):
+        try:
+            async with async_session_maker() as session:
+                await session.execute(insert(ModerationLog), rows)
+                await session.commit()
+        except Exception as e:
+            logging.error(f"Failed to write {len(rows)} moderation logs: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            if row is None:
+                return
+
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+
+            await self._write(batch)
+            if stop:
+                return
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Drain everything queued so far and stop the writer"""
+        if self._task is None:
+            return
+        # Sentinel goes behind all pending rows
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+log_sink = ModerationLogSink()
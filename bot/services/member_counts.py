@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Set
+from aiogram import Bot
+from sqlalchemy import select, update, or_
+from bot.database.core import async_session_maker
+from bot.database.models import Group
+from bot.services.outbox import outbox
+from config import MEMBER_COUNT_TTL, MEMBER_COUNT_INTERVAL, MEMBER_COUNT_BATCH, MEMBER_COUNT_CONCURRENCY
+
+class MemberCountRefresher:
+    """
+    Keeps Group.member_count fresh so the API never calls Telegram inline.
+
+    Every `interval` seconds the groups with the oldest (or missing) counts
+    are refreshed, at most `concurrency` get_chat_member_count calls at a
+    time through the outbox. request() queues a group for the next pass,
+    e.g. right after the bot joins it, in the process that runs the refresher.
+    """
+
+    def __init__(
+        self,
+        ttl: int = MEMBER_COUNT_TTL,
+        interval: float = MEMBER_COUNT_INTERVAL,
+        batch_size: int = MEMBER_COUNT_BATCH,
+        concurrency: int = MEMBER_COUNT_CONCURRENCY
+    ):
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._requested: Set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._bot: Optional[Bot] = None
+
+    def request(self, group_id: int):
+        if self._task is None:
+            # Not running in this process (sharded mode: worker 0 only). New groups
+            # have no count yet and come first in its next stale scan anyway.
+            return
+        self._requested.add(group_id)
+        self._wakeup.set()
+
+    async def _stale_groups(self) -> Set[int]:
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(Group.id)
+                .where(or_(Group.member_count_updated_at.is_(None), Group.member_count_updated_at < cutoff))
+                .order_by(Group.member_count_updated_at.is_not(None), Group.member_count_updated_at)
+                .limit(self.batch_size)
+            )
+            return set(result.scalars().all())
+
+    async def refresh(self, group_ids: Iterable[int]) -> Dict[int, int]:
+        bot = self._bot
+        semaphore = asyncio.Semaphore(self.concurrency)
+        counts: Dict[int, int] = {}
+        failed: Set[int] = set()
+
+        async def fetch(group_id: int):
+            async with semaphore:
+                try:
+                    counts[group_id] = await outbox.call(group_id, lambda: bot.get_chat_member_count(group_id))
+                except Exception as e:
+                    logging.warning(f"Member count for {group_id} failed: {e}")
+                    failed.add(group_id)
+
+        await asyncio.gather(*(fetch(group_id) for group_id in group_ids))
+        if counts or failed:
+            now = datetime.utcnow()
+            async with async_session_maker() as session:
+                for group_id, count in counts.items():
+                    await session.execute(
+                        update(Group).where(Group.id == group_id)
+                        .values(member_count=count, member_count_updated_at=now)
+                    )
+                if failed:
+                    # Keep the last known count, retry after ttl (bot was probably removed)
+                    await session.execute(
+                        update(Group).where(Group.id.in_(failed)).values(member_count_updated_at=now)
+                    )
+                await session.commit()
+        return counts
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                group_ids, self._requested = self._requested, set()
+                group_ids |= await self._stale_groups()
+                if group_ids:
+                    await self.refresh(group_ids)
+            except Exception as e:
+                logging.error(f"Member count refresh failed: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, bot: Bot):
+        self._bot = bot
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+member_counts = MemberCountRefresher()
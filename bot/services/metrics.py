@@ -0,0 +1,127 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds, tuned for in-process work up to slow Bot API calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """
+    Monotonic counter. Updates are plain dict arithmetic on the event loop
+    thread, no locks involved.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in self._values.items()]
+
+class Histogram:
+    """Fixed buckets, stored non-cumulative and summed up on render"""
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        row = self._values.get(labels)
+        if row is None:
+            row = self._values[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, row in self._values.items():
+            total = 0
+            for bound, count in zip(self.buckets + ("+Inf",), row):
+                total += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {row[-1]}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time, costs nothing in between"""
+    kind = "gauge"
+
+    def __init__(self, name: str, doc: str, func: Callable[[], float]):
+        self.name = name
+        self.doc = doc
+        self.func = func
+
+    def samples(self) -> List[str]:
+        try:
+            return [f"{self.name} {float(self.func())}"]
+        except Exception:
+            return []
+
+class CallbackCounter(Gauge):
+    """Counter kept elsewhere (e.g. cache hit counts), read at scrape time"""
+    kind = "counter"
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def _add(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, doc: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, doc, labels))
+
+    def histogram(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, doc, labels, buckets))
+
+    def gauge(self, name: str, doc: str, func: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(name, doc, func))
+
+    def counter_callback(self, name: str, doc: str, func: Callable[[], float]) -> CallbackCounter:
+        return self._add(CallbackCounter(name, doc, func))
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+updates_total = registry.counter("bot_updates_total", "Telegram updates received", ["type"])
+update_seconds = registry.histogram("bot_update_seconds", "Time to process one update", ["type"])
+handler_seconds = registry.histogram("bot_handler_seconds", "Handler latency per router", ["router", "event"])
+handler_errors_total = registry.counter("bot_handler_errors_total", "Handlers that raised", ["router", "event"])
+db_query_seconds = registry.histogram("bot_db_query_seconds", "SQL statement latency", ["statement"])
+db_errors_total = registry.counter("bot_db_errors_total", "Failed SQL statements", ["statement"])
+telegram_request_seconds = registry.histogram("bot_telegram_request_seconds", "Bot API call latency", ["method"])
+telegram_errors_total = registry.counter("bot_telegram_errors_total", "Failed Bot API calls", ["method", "code"])
+redis_seconds = registry.histogram("bot_redis_seconds", "Redis round trip latency", ["operation"])
+redis_errors_total = registry.counter("bot_redis_errors_total", "Failed Redis calls", ["operation"])
@@ -0,0 +1,255 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from config import OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CONCURRENCY
+
+# Lower value goes first
+PRIORITY_ACTION = 0 # delete / restrict / ban
+PRIORITY_NOTICE = 1 # warn, mute, ban messages
+PRIORITY_BACKGROUND = 2 # broadcasts, warm-up: only the global budget left over by the above
+
+MAX_TEXT_LENGTH = 4096
+MAX_RETRIES = 3
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    async def acquire(self):
+        while True:
+            delay = self.delay(time.monotonic())
+            if delay <= 0:
+                self.take()
+                return
+            await asyncio.sleep(delay)
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'chat_id', 'bot', 'factory', 'text', 'kwargs', 'future', 'coalesce_key', 'retries')
+
+    def __init__(self, priority: int, seq: int, chat_id: int):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.bot: Optional[Bot] = None
+        self.factory: Optional[Callable[[], Awaitable]] = None # API call job
+        self.text: Optional[str] = None # send_message job
+        self.kwargs: Dict[str, Any] = {}
+        self.future: Optional[asyncio.Future] = None
+        self.coalesce_key = None
+        self.retries = 0
+
+    @property
+    def is_message(self) -> bool:
+        return self.factory is None
+
+    def __lt__(self, other: "_Job") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class Outbox:
+    """
+    Rate limited dispatcher for outgoing Bot API calls.
+
+    - one global token bucket for every call, one bucket per chat for messages
+    - moderation actions (call) go before notices (notify)
+    - TelegramRetryAfter pauses the chat and requeues the job after retry_after
+    - pending notices with the same coalesce_key are merged into one message
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOX_GLOBAL_RATE,
+        chat_rate: float = OUTBOX_CHAT_RATE,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_chats: int = 10000
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate / 60
+        self.chat_capacity = chat_rate
+        self.max_chats = max_chats
+        self._chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._paused: Dict[int, float] = {} # chat_id -> monotonic time
+        self._ready: List[_Job] = []
+        self._delayed: List[Tuple[float, _Job]] = []
+        self._coalesce: Dict[Any, _Job] = {}
+        self._seq = itertools.count()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Fire-and-forget sends and running jobs, referenced until done
+        self._running: Set[asyncio.Task] = set()
+
+    @property
+    def depth(self) -> int:
+        return len(self._ready) + len(self._delayed)
+
+    async def call(self, chat_id: int, factory: Callable[[], Awaitable], priority: int = PRIORITY_ACTION):
+        """Run `factory()` (a Bot API call) through the queue and return its result"""
+        if self._task is None:
+            return await factory()
+
+        job = _Job(priority, next(self._seq), chat_id)
+        job.factory = factory
+        job.future = asyncio.get_running_loop().create_future()
+        self._push(job)
+        return await job.future
+
+    def notify(self, bot: Bot, chat_id: int, text: str, coalesce_key: Any = None, priority: int = PRIORITY_NOTICE, **kwargs):
+        """Queue a message without waiting for it. Failures are logged."""
+        if self._task is None:
+            self._spawn(self._send_direct(bot, chat_id, text, kwargs))
+            return
+
+        if coalesce_key is not None:
+            pending = self._coalesce.get(coalesce_key)
+            if pending is not None and len(pending.text) + len(text) + 2 <= MAX_TEXT_LENGTH:
+                pending.text = f"{pending.text}\n\n{text}"
+                return
+
+        job = _Job(priority, next(self._seq), chat_id)
+        job.bot = bot
+        job.text = text
+        job.kwargs = kwargs
+        job.coalesce_key = coalesce_key
+        if coalesce_key is not None:
+            self._coalesce[coalesce_key] = job
+        self._push(job)
+
+    async def _send_direct(self, bot: Bot, chat_id: int, text: str, kwargs: dict):
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+        except Exception as e:
+            logging.error(f"Failed to send message to {chat_id}: {e}")
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    def _push(self, job: _Job):
+        heapq.heappush(self._ready, job)
+        self._wakeup.set()
+
+    def _defer(self, job: _Job, until: float):
+        heapq.heappush(self._delayed, (until, job))
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_capacity)
+            while len(self._chat_buckets) > self.max_chats:
+                self._chat_buckets.popitem(last=False)
+        self._chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                heapq.heappush(self._ready, heapq.heappop(self._delayed)[1])
+
+            timeout = self._delayed[0][0] - now if self._delayed else None
+            if self._ready:
+                job = self._ready[0]
+                if job.is_message:
+                    # Per chat limit only applies to messages, blocked chats do not hold up others
+                    paused_until = self._paused.get(job.chat_id, 0)
+                    if paused_until and paused_until <= now:
+                        del self._paused[job.chat_id]
+                    wait = max(paused_until - now, self._chat_bucket(job.chat_id).delay(now))
+                    if wait > 0:
+                        heapq.heappop(self._ready)
+                        self._defer(job, now + wait)
+                        continue
+
+                wait = self.global_bucket.delay(now)
+                if wait <= 0:
+                    heapq.heappop(self._ready)
+                    self.global_bucket.take()
+                    if job.is_message:
+                        self._chat_bucket(job.chat_id).take()
+                        if job.coalesce_key is not None:
+                            self._coalesce.pop(job.coalesce_key, None)
+                    await self._slots.acquire()
+                    self._spawn(self._execute(job))
+                    continue
+                timeout = wait if timeout is None else min(timeout, wait)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job: _Job):
+        try:
+            if job.is_message:
+                result = await job.bot.send_message(job.chat_id, job.text, **job.kwargs)
+            else:
+                result = await job.factory()
+        except TelegramRetryAfter as e:
+            if job.is_message:
+                self._paused[job.chat_id] = time.monotonic() + e.retry_after
+            job.retries += 1
+            if job.retries <= MAX_RETRIES:
+                self._defer(job, time.monotonic() + e.retry_after)
+            else:
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            if job.future is not None and not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._slots.release()
+
+    def _fail(self, job: _Job, error: Exception):
+        if job.future is not None:
+            if not job.future.done():
+                job.future.set_exception(error)
+        else:
+            logging.error(f"Failed to send message to {job.chat_id}: {error}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5):
+        """Give queued jobs up to `timeout` seconds, then stop"""
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self.depth and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        for job in self._ready + [job for _, job in self._delayed]:
+            self._fail(job, RuntimeError("Outbox stopped"))
+        self._ready, self._delayed = [], []
+        self._coalesce.clear()
+
+outbox = Outbox()
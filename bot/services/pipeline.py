@@ -0,0 +1,173 @@
+import re
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from bot.database.models import GroupSettings
+from bot.services.settings_cache import settings_cache
+from bot.services.word_filter import WordMatcher, get_matcher, normalize
+from bot.services.duplicates import duplicate_detector
+from bot.services.rate_limiter import flood_limiter
+
+# Reason keys (also locale keys, except FLOOD which has its own handling)
+FORWARD = 'forward_detected'
+LINK = 'link_detected'
+BAD_WORD = 'bad_word'
+DUPLICATE = 'duplicate_detected'
+FLOOD = 'flood'
+MEDIA = 'media_blocked'
+
+# Media kinds a group can disallow, one bit each
+MEDIA_PHOTO = 1
+MEDIA_VIDEO = 2
+MEDIA_STICKER = 4
+MEDIA_GIF = 8
+
+# message.content_type -> media bit
+CONTENT_MEDIA = {
+    'photo': MEDIA_PHOTO,
+    'video': MEDIA_VIDEO,
+    'video_note': MEDIA_VIDEO,
+    'sticker': MEDIA_STICKER,
+    'animation': MEDIA_GIF,
+}
+
+def blocked_media(settings: GroupSettings) -> int:
+    """Bitmask of the media kinds the group does not allow"""
+    mask = 0
+    if settings.allow_photos is False:
+        mask |= MEDIA_PHOTO
+    if settings.allow_videos is False:
+        mask |= MEDIA_VIDEO
+    if settings.allow_stickers is False:
+        mask |= MEDIA_STICKER
+    if settings.allow_gifs is False:
+        mask |= MEDIA_GIF
+    return mask
+
+LINK_REGEX = re.compile(r'(http://|https://|www\.|t\.me|telegram\.me|[a-zA-Z0-9-]+\.[a-zA-Z]{2,})', re.IGNORECASE)
+MENTION_REGEX = re.compile(r'@\w+')
+
+class MessageContext:
+    """
+    What the rules look at, shared by all of them for one message.
+    The normalized forms are computed once, on first use.
+    """
+    __slots__ = ('text', 'entities', 'is_forward', '_normalized')
+
+    def __init__(self, text: Optional[str], entities: list = None, is_forward: bool = False):
+        self.text = text or ""
+        self.entities = entities or ()
+        self.is_forward = is_forward
+        self._normalized: Optional[Tuple[str, str]] = None
+
+    @property
+    def normalized(self) -> Tuple[str, str]:
+        """(latin transliteration, homoglyph skeleton), see word_filter.normalize"""
+        if self._normalized is None:
+            self._normalized = normalize(self.text)
+        return self._normalized
+
+Rule = Callable[[MessageContext], Optional[str]]
+
+def forward_rule(ctx: MessageContext) -> Optional[str]:
+    return FORWARD if ctx.is_forward else None
+
+def link_rule(entity_types: frozenset) -> Rule:
+    def rule(ctx: MessageContext) -> Optional[str]:
+        for entity in ctx.entities:
+            if entity.type in entity_types:
+                return LINK
+        if ctx.text and LINK_REGEX.search(ctx.text):
+            return LINK
+        return None
+    return rule
+
+def mention_rule(ctx: MessageContext) -> Optional[str]:
+    return LINK if ctx.text and MENTION_REGEX.search(ctx.text) else None
+
+def word_rule(matcher: WordMatcher) -> Rule:
+    def rule(ctx: MessageContext) -> Optional[str]:
+        if ctx.text and matcher.search_normalized(*ctx.normalized):
+            return BAD_WORD
+        return None
+    return rule
+
+class Pipeline:
+    """
+    The enabled checks of one group, in order: disallowed media (a bitmask
+    test on the content type, see media_blocked), plain attribute and entity
+    checks, regexes, forbidden words (normalized text), then the stateful
+    duplicate window and finally the flood limiter (may be a Redis call).
+    An empty pipeline means nothing in the group needs to be looked at.
+    """
+
+    def __init__(self, settings: GroupSettings):
+        rules: List[Rule] = []
+        if settings.delete_forwards:
+            rules.append(forward_rule)
+        if settings.delete_links:
+            types = {'url', 'text_link'}
+            if settings.delete_mentions:
+                types.add('mention')
+            rules.append(link_rule(frozenset(types)))
+        if settings.delete_mentions:
+            rules.append(mention_rule)
+        matcher = get_matcher(settings)
+        if matcher is not None and matcher.active:
+            rules.append(word_rule(matcher))
+
+        self.rules: Tuple[Rule, ...] = tuple(rules)
+        self.blocked_media = blocked_media(settings)
+        self.duplicates = bool(settings.duplicate_detection)
+        self.flood: Optional[Tuple[int, int]] = (
+            (settings.flood_threshold, settings.flood_period) if settings.anti_spam_enabled else None
+        )
+
+    @property
+    def empty(self) -> bool:
+        return not self.blocked_media and not self.rules and not self.duplicates and self.flood is None
+
+    def media_blocked(self, content_type: str) -> bool:
+        """Checked before the text of the message is looked at"""
+        return bool(self.blocked_media & CONTENT_MEDIA.get(content_type, 0))
+
+    def check(self, ctx: MessageContext) -> Optional[str]:
+        """Stateless content rules only"""
+        for rule in self.rules:
+            reason = rule(ctx)
+            if reason:
+                return reason
+        return None
+
+    async def run(self, ctx: MessageContext, group_id: int, user_id: int) -> Optional[str]:
+        """First reason to act on the message, None if it is fine"""
+        reason = self.check(ctx)
+        if reason:
+            return reason
+        if self.duplicates and ctx.text and duplicate_detector.check(group_id, user_id, ctx.text, ctx.normalized[1]):
+            return DUPLICATE
+        if self.flood and await flood_limiter.hit(f"flood:{group_id}:{user_id}", *self.flood):
+            return FLOOD
+        return None
+
+_MAX_PIPELINES = 10000
+# group_id -> (settings version, pipeline)
+_pipelines: "OrderedDict[int, Tuple[int, Pipeline]]" = OrderedDict()
+
+def get_pipeline(settings: GroupSettings) -> Pipeline:
+    """Compiled pipeline for the group, rebuilt only when its settings version changes"""
+    version = settings_cache.version(settings.group_id)
+    if version is None:
+        # Settings object did not come from the cache, do not keep the result
+        return Pipeline(settings)
+
+    entry = _pipelines.get(settings.group_id)
+    if entry and entry[0] == version:
+        _pipelines.move_to_end(settings.group_id)
+        return entry[1]
+
+    pipeline = Pipeline(settings)
+    _pipelines[settings.group_id] = (version, pipeline)
+    _pipelines.move_to_end(settings.group_id)
+    while len(_pipelines) > _MAX_PIPELINES:
+        _pipelines.popitem(last=False)
+    return pipeline
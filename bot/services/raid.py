@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Iterable, Set
+from bot.database.models import GroupSettings
+
+class _GroupState:
+    __slots__ = ('joins', 'window', 'threshold', 'locked', 'raiders')
+
+    def __init__(self, threshold: int, window: float):
+        # Counting beyond threshold+1 is never needed
+        self.joins: Deque[float] = deque(maxlen=threshold + 1)
+        self.window = window
+        self.threshold = threshold
+        self.locked = False
+        self.raiders: Set[int] = set()
+
+class RaidGuard:
+    """
+    Per-group sliding window of join times.
+
+    A group enters lockdown when `raid_join_threshold` joins happen within
+    `raid_join_window` seconds and leaves it once the rate in the window drops
+    below half the threshold. Users who joined during lockdown are remembered
+    so their messages can be dropped before any DB or API work.
+    """
+
+    def __init__(self, max_groups: int = 10000, max_raiders: int = 10000):
+        self.max_groups = max_groups
+        self.max_raiders = max_raiders
+        self._groups: "OrderedDict[int, _GroupState]" = OrderedDict()
+
+    def record_joins(self, settings: GroupSettings, count: int) -> bool:
+        """Register `count` joins, returns True if the group is (now) in lockdown"""
+        if not settings.raid_protection_enabled or count <= 0:
+            return False
+
+        state = self._groups.get(settings.group_id)
+        threshold = max(1, settings.raid_join_threshold)
+        if state is None or state.threshold != threshold:
+            previous = state
+            state = _GroupState(threshold, settings.raid_join_window)
+            if previous is not None:
+                state.locked, state.raiders = previous.locked, previous.raiders
+            self._groups[settings.group_id] = state
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+        state.window = settings.raid_join_window
+        self._groups.move_to_end(settings.group_id)
+
+        now = time.monotonic()
+        state.joins.extend([now] * min(count, threshold + 1))
+        self._update(state, now)
+        return state.locked
+
+    def is_locked(self, group_id: int) -> bool:
+        state = self._groups.get(group_id)
+        if state is None or not state.locked:
+            return False
+        self._update(state, time.monotonic())
+        return state.locked
+
+    def add_raiders(self, group_id: int, user_ids: Iterable[int]):
+        state = self._groups.get(group_id)
+        if state is None:
+            return
+        state.raiders.update(user_ids)
+        while len(state.raiders) > self.max_raiders:
+            state.raiders.pop()
+
+    def is_raider(self, group_id: int, user_id: int) -> bool:
+        """Fast path check, only true while the group is locked down"""
+        state = self._groups.get(group_id)
+        if state is None or not state.locked or user_id not in state.raiders:
+            return False
+        return self.is_locked(group_id)
+
+    def _update(self, state: _GroupState, now: float):
+        while state.joins and state.joins[0] <= now - state.window:
+            state.joins.popleft()
+
+        rate = len(state.joins)
+        if not state.locked and rate >= state.threshold:
+            state.locked = True
+        elif state.locked and rate < max(1, state.threshold // 2):
+            state.locked = False
+            state.raiders.clear()
+
+raid_guard = RaidGuard()
@@ -0,0 +1,125 @@
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import List
+from bot.services.metrics import redis_seconds, redis_errors_total
+from config import REDIS_URL, FLOOD_BACKEND, FLOOD_MAX_KEYS
+
+class RateLimiter(ABC):
+    """
+    Sliding window rate limiter interface.
+    hit() records one event for `key` and returns True when more than `limit`
+    events happened within the last `period` seconds.
+    """
+
+    @abstractmethod
+    async def hit(self, key: str, limit: int, period: float) -> bool:
+        ...
+
+class MemoryRateLimiter(RateLimiter):
+    """
+    In-process sliding window log. Each key keeps at most limit+1 timestamps,
+    idle keys are evicted and the number of keys is capped at `max_keys`.
+    """
+
+    def __init__(self, max_keys: int = FLOOD_MAX_KEYS):
+        self.max_keys = max_keys
+        # key -> [period, timestamps], least recently hit first
+        self._windows: "OrderedDict[str, List]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    async def hit(self, key: str, limit: int, period: float) -> bool:
+        now = time.monotonic()
+        entry = self._windows.get(key)
+        if entry is None or entry[1].maxlen != limit + 1:
+            entry = self._windows[key] = [period, deque(maxlen=limit + 1)]
+        else:
+            entry[0] = period
+        self._windows.move_to_end(key)
+        window = entry[1]
+
+        while window and window[0] <= now - period:
+            window.popleft()
+        window.append(now)
+
+        self._evict(now)
+        return len(window) > limit
+
+    def _evict(self, now: float):
+        # Front of the dict holds the least recently hit keys
+        while self._windows:
+            period, window = next(iter(self._windows.values()))
+            if len(self._windows) <= self.max_keys and window and window[-1] > now - period:
+                break
+            self._windows.popitem(last=False)
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Shared sliding window in a Redis sorted set.
+    Trim, add, count and expire run as one atomic script - a single round trip,
+    and the key can never be left without a TTL.
+    """
+
+    SCRIPT = """
+    local key = KEYS[1]
+    local now = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local limit = tonumber(ARGV[3])
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('ZREMRANGEBYRANK', key, 0, -(limit + 2))
+    redis.call('PEXPIRE', key, window)
+    return redis.call('ZCARD', key)
+    """
+
+    def __init__(self, url: str):
+        from redis.asyncio import Redis
+        self.client = Redis.from_url(url, decode_responses=True)
+        self._script = self.client.register_script(self.SCRIPT)
+
+    async def hit(self, key: str, limit: int, period: float) -> bool:
+        now_ms = int(time.time() * 1000)
+        started = time.perf_counter()
+        try:
+            count = await self._script(
+                keys=[key],
+                args=[now_ms, int(period * 1000), limit, f"{now_ms}:{uuid.uuid4().hex[:8]}"]
+            )
+        except Exception:
+            redis_errors_total.inc("rate_limit")
+            raise
+        finally:
+            redis_seconds.observe(time.perf_counter() - started, "rate_limit")
+        return int(count) > limit
+
+class FallbackRateLimiter(RateLimiter):
+    """Uses `primary` and switches to `fallback` for the calls where it fails"""
+
+    def __init__(self, primary: RateLimiter, fallback: RateLimiter):
+        self.primary = primary
+        self.fallback = fallback
+
+    async def hit(self, key: str, limit: int, period: float) -> bool:
+        try:
+            return await self.primary.hit(key, limit, period)
+        except Exception as e:
+            logging.error(f"Rate limiter error, using in-memory fallback: {e}")
+            return await self.fallback.hit(key, limit, period)
+
+def create_rate_limiter() -> RateLimiter:
+    if FLOOD_BACKEND == 'redis':
+        if REDIS_URL:
+            try:
+                return FallbackRateLimiter(RedisRateLimiter(REDIS_URL), MemoryRateLimiter())
+            except ImportError:
+                logging.warning("Redis not installed. Using in-memory flood control.")
+        else:
+            logging.warning("FLOOD_BACKEND=redis but REDIS_URL is not set. Using in-memory flood control.")
+    return MemoryRateLimiter()
+
+# Redis (shared) or in-process sliding window, see FLOOD_BACKEND
+flood_limiter = create_rate_limiter()
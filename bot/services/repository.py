@@ -1,7 +1,11 @@
-from sqlalchemy import select, update, delete
+from datetime import date, datetime
+from sqlalchemy import select, update, delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from bot.database.models import User, Group, GroupSettings, ModerationLog, Warn
+from bot.database.core import upsert
+from bot.database.models import User, Group, GroupSettings, SettingsTemplate, ModerationLog, ModerationDailyStat, Warn
+from bot.services.settings_cache import settings_cache
+from bot.services.log_sink import log_sink
 
 class Repository:
     def __init__(self, session: AsyncSession):
@@ -22,7 +26,16 @@ class Repository:
     async def get_user(self, user_id: int) -> User:
         return await self.session.get(User, user_id)
 
-    async def get_group_settings(self, group_id: int) -> GroupSettings:
+    async def get_group_settings(self, group_id: int, use_cache: bool = True) -> GroupSettings:
+        """
+        Cached read of group settings. Pass use_cache=False when the returned
+        object is going to be modified, and invalidate the cache after commit.
+        """
+        if use_cache:
+            settings = settings_cache.get(group_id)
+            if settings is not None:
+                return settings
+
         stmt = select(GroupSettings).where(GroupSettings.group_id == group_id)
         result = await self.session.execute(stmt)
         settings = result.scalar_one_or_none()
@@ -39,7 +52,9 @@ class Repository:
             settings = GroupSettings(group_id=group_id)
             self.session.add(settings)
             await self.session.commit()
-                
+
+        if use_cache:
+            settings_cache.set(group_id, settings)
         return settings
 
     async def get_groups_by_owner(self, owner_id: int) -> list[Group]:
@@ -47,6 +62,49 @@ class Repository:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def update_owned_settings(self, owner_id: int, group_ids: list[int], values: dict) -> list[int]:
+        """
+        Apply the same column values to the settings of many groups in one UPDATE,
+        limited to groups of `owner_id`. Returns the updated group ids. The caller
+        commits and invalidates the settings cache.
+        """
+        owned = select(Group.id).where(Group.owner_id == owner_id)
+        stmt = (
+            update(GroupSettings)
+            .where(GroupSettings.group_id.in_(group_ids), GroupSettings.group_id.in_(owned))
+            .values(**values, version=GroupSettings.version + 1, updated_at=datetime.utcnow())
+            .returning(GroupSettings.group_id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def get_templates(self, owner_id: int) -> list[SettingsTemplate]:
+        stmt = select(SettingsTemplate).where(SettingsTemplate.owner_id == owner_id).order_by(SettingsTemplate.name)
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def save_template(self, owner_id: int, name: str, settings: dict) -> int:
+        """Create or replace the owner's template with this name (single INSERT ... ON CONFLICT), returns its id"""
+        now = datetime.utcnow()
+        stmt = upsert(SettingsTemplate).values(
+            owner_id=owner_id, name=name, settings=settings, created_at=now, updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SettingsTemplate.owner_id, SettingsTemplate.name],
+            set_={"settings": stmt.excluded.settings, "updated_at": stmt.excluded.updated_at}
+        ).returning(SettingsTemplate.id)
+        result = await self.session.execute(stmt)
+        template_id = result.scalar_one()
+        await self.session.commit()
+        return template_id
+
+    async def delete_template(self, owner_id: int, template_id: int) -> bool:
+        stmt = delete(SettingsTemplate).where(SettingsTemplate.id == template_id, SettingsTemplate.owner_id == owner_id)
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        return result.rowcount > 0
+
     async def get_or_create_group(self, group_id: int, title: str, owner_id: int) -> Group:
         group = await self.session.get(Group, group_id)
         if not group:
@@ -65,25 +123,36 @@ class Repository:
         return group
 
     async def log_action(self, group_id: int, user_id: int, action: str, reason: str = None):
-        log = ModerationLog(group_id=group_id, user_id=user_id, action=action, reason=reason)
-        self.session.add(log)
-        await self.session.commit()
+        """Queue a moderation log row, written in bulk by log_sink (no commit here)"""
+        await log_sink.submit(group_id, user_id, action, reason)
+
+    async def get_daily_stats(self, group_id: int, since: date) -> list[ModerationDailyStat]:
+        """Rolled up moderation counts per day and action (see bot.services.log_rollup)"""
+        stmt = select(ModerationDailyStat).where(
+            ModerationDailyStat.group_id == group_id, ModerationDailyStat.day >= since
+        ).order_by(ModerationDailyStat.day)
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def count_warned_users(self, group_id: int) -> int:
+        stmt = select(func.count()).select_from(Warn).where(Warn.group_id == group_id)
+        return await self.session.scalar(stmt)
 
     async def add_warn(self, group_id: int, user_id: int, reason: str = None) -> int:
-        """Add warn and return new count"""
-        stmt = select(Warn).where(Warn.group_id == group_id, Warn.user_id == user_id)
+        """Add warn and return new count (single atomic INSERT ... ON CONFLICT)"""
+        stmt = upsert(Warn).values(
+            group_id=group_id, user_id=user_id, count=1, reason=reason, updated_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Warn.group_id, Warn.user_id],
+            set_={
+                "count": Warn.count + 1,
+                "reason": stmt.excluded.reason, # Update reason to latest
+                "updated_at": stmt.excluded.updated_at,
+            }
+        ).returning(Warn.count)
         result = await self.session.execute(stmt)
-        warn = result.scalar_one_or_none()
-        
-        if warn:
-            warn.count += 1
-            warn.reason = reason # Update reason to latest
-            new_count = warn.count
-        else:
-            warn = Warn(group_id=group_id, user_id=user_id, count=1, reason=reason)
-            self.session.add(warn)
-            new_count = 1
-            
+        new_count = result.scalar_one()
         await self.session.commit()
         return new_count
 
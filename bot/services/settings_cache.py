@@ -0,0 +1,69 @@
+import time
+import itertools
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from bot.database.models import GroupSettings
+from config import SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL
+
+class SettingsCache:
+    """
+    Bounded LRU/TTL cache for GroupSettings, shared by middlewares, handlers and the API.
+
+    Every stored entry gets a process-wide unique version number. Anything derived
+    from the settings (compiled filters etc.) can be keyed by (group_id, version)
+    and will be rebuilt automatically after an invalidation or reload.
+    """
+
+    def __init__(self, max_size: int = SETTINGS_CACHE_SIZE, ttl: float = SETTINGS_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # group_id -> (expires_at, version, settings)
+        self._entries: "OrderedDict[int, Tuple[float, int, GroupSettings]]" = OrderedDict()
+        self._versions = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+        # Called with the group id on invalidate(), e.g. to reach other processes
+        self.listeners: List[Callable[[int], None]] = []
+
+    def get(self, group_id: int) -> Optional[GroupSettings]:
+        entry = self._entries.get(group_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, settings = entry
+        if expires_at < time.monotonic():
+            del self._entries[group_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(group_id)
+        self.hits += 1
+        return settings
+
+    def set(self, group_id: int, settings: GroupSettings) -> int:
+        """Store settings and return the version assigned to them"""
+        version = next(self._versions)
+        self._entries[group_id] = (time.monotonic() + self.ttl, version, settings)
+        self._entries.move_to_end(group_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return version
+
+    def version(self, group_id: int) -> Optional[int]:
+        entry = self._entries.get(group_id)
+        return entry[1] if entry else None
+
+    def invalidate(self, group_id: int):
+        self._entries.pop(group_id, None)
+        for listener in self.listeners:
+            listener(group_id)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+settings_cache = SettingsCache()
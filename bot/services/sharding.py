@@ -0,0 +1,117 @@
+import queue
+import bisect
+import hashlib
+from typing import Any, List
+from config import SHARD_VNODES
+
+# Where the chat id lives for each update type
+CHAT_UPDATES = (
+    'message', 'edited_message', 'channel_post', 'edited_channel_post', 'business_message',
+    'edited_business_message', 'my_chat_member', 'chat_member', 'chat_join_request',
+    'message_reaction', 'message_reaction_count', 'chat_boost', 'removed_chat_boost',
+)
+USER_UPDATES = ('inline_query', 'chosen_inline_result', 'shipping_query', 'pre_checkout_query', 'poll_answer')
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+def update_chat_id(update: dict) -> int:
+    """Chat an update belongs to (user id for updates without a chat, 0 if unknown)"""
+    for key in CHAT_UPDATES:
+        event = update.get(key)
+        if event:
+            return event.get('chat', {}).get('id', 0)
+    callback = update.get('callback_query')
+    if callback:
+        message = callback.get('message')
+        if message:
+            return message.get('chat', {}).get('id', 0)
+        return callback.get('from', {}).get('id', 0)
+    for key in USER_UPDATES:
+        event = update.get(key)
+        if event:
+            user = event.get('from') or event.get('user') or {}
+            return user.get('id', 0)
+    return 0
+
+class HashRing:
+    """
+    Consistent hashing of chat ids onto shards. Each shard owns `vnodes`
+    points on the ring, so changing the shard count only moves about 1/N
+    of the chats (and their in-memory state) to another process.
+    """
+
+    def __init__(self, shards: int, vnodes: int = SHARD_VNODES):
+        self.shards = shards
+        points = sorted((_hash(f"shard-{shard}:{v}"), shard) for shard in range(shards) for v in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, chat_id: int) -> int:
+        if self.shards == 1:
+            return 0
+        index = bisect.bisect(self._keys, _hash(str(chat_id))) % len(self._keys)
+        return self._owners[index]
+
+class ShardInfo:
+    """Identity of the current process, single process mode is shard 0 of 1"""
+
+    def __init__(self):
+        self.index = 0
+        self.count = 1
+        self.restarted = False # Worker was restarted by the parent after a crash
+        self.ring = HashRing(1)
+
+    def configure(self, index: int, count: int, restarted: bool = False):
+        self.index = index
+        self.count = count
+        self.restarted = restarted
+        self.ring = HashRing(count)
+
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1
+
+    @property
+    def is_primary(self) -> bool:
+        """Runs the jobs that must exist once (rollups, member counts)"""
+        return self.index == 0
+
+    def owns(self, chat_id: int) -> bool:
+        return self.ring.shard_for(chat_id) == self.index
+
+class ShardRouter:
+    """
+    Parent side of sharded mode: routes raw updates to the worker queue of
+    the owning shard. All updates of a chat go to the same worker, in order.
+    Control messages are (name, payload) tuples.
+    """
+
+    def __init__(self, ring: HashRing, queues: List[Any]):
+        self.ring = ring
+        self.queues = queues
+
+    def submit(self, update: dict) -> bool:
+        """False when the shard queue is full (webhook answers 503, polling waits)"""
+        return self._put(update_chat_id(update), update)
+
+    def control(self, chat_id: int, name: str, payload: Any = None) -> bool:
+        return self._put(chat_id, (name, payload))
+
+    def _put(self, chat_id: int, item) -> bool:
+        try:
+            self.queues[self.ring.shard_for(chat_id)].put_nowait(item)
+        except queue.Full:
+            return False
+        return True
+
+    def depth(self) -> int:
+        total = 0
+        for q in self.queues:
+            try:
+                total += q.qsize()
+            except NotImplementedError: # macOS
+                pass
+        return total
+
+shard = ShardInfo()
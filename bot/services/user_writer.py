@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func
+from bot.database.core import async_session_maker, upsert
+from bot.database.models import User
+from config import USER_FLUSH_INTERVAL, USER_FLUSH_BATCH, USER_FINGERPRINT_SIZE
+
+class UserWriter:
+    """
+    Write-behind layer for user profiles seen in group messages.
+
+    Remembers the last written (username, full_name) of recent users and skips
+    unchanged ones. Real changes are collected and written in bulk
+    INSERT ... ON CONFLICT statements every `flush_interval` seconds, or sooner
+    when `batch_size` users are pending. Pending changes are flushed on stop().
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = USER_FLUSH_INTERVAL,
+        batch_size: int = USER_FLUSH_BATCH,
+        max_known: int = USER_FINGERPRINT_SIZE
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_known = max_known
+        # user_id -> (username, full_name) as last written to DB
+        self._known: "OrderedDict[int, Tuple[Optional[str], Optional[str]]]" = OrderedDict()
+        self._pending: Dict[int, dict] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def touch(self, user_id: int, username: str = None, full_name: str = None, language: str = None):
+        """Record a user seen in a message. Never touches the DB."""
+        fingerprint = (username, full_name)
+        if self._known.get(user_id) == fingerprint:
+            self._known.move_to_end(user_id)
+            return
+
+        self._pending[user_id] = {
+            "id": user_id,
+            "username": username,
+            "full_name": full_name,
+            "language": language or 'uz',
+        }
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        rows = list(batch.values())
+        try:
+            async with async_session_maker() as session:
+                for i in range(0, len(rows), self.batch_size):
+                    stmt = upsert(User).values(rows[i:i + self.batch_size])
+                    # Same semantics as Repository.upsert_user: never blank out known
+                    # names and never overwrite the language the user picked
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[User.id],
+                        set_={
+                            "username": func.coalesce(stmt.excluded.username, User.username),
+                            "full_name": func.coalesce(stmt.excluded.full_name, User.full_name),
+                        }
+                    )
+                    await session.execute(stmt)
+                await session.commit()
+        except asyncio.CancelledError:
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            logging.error(f"User flush failed ({len(rows)} users): {e}")
+            self._requeue(batch)
+            return
+
+        for row in rows:
+            self._known[row["id"]] = (row["username"], row["full_name"])
+            self._known.move_to_end(row["id"])
+        while len(self._known) > self.max_known:
+            self._known.popitem(last=False)
+
+    def _requeue(self, batch: Dict[int, dict]):
+        # Put them back unless a newer version arrived meanwhile
+        for user_id, row in batch.items():
+            self._pending.setdefault(user_id, row)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+user_writer = UserWriter()
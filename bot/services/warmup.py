@@ -0,0 +1,139 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+from aiogram import Bot
+from sqlalchemy import select
+from bot.database.core import async_session_maker
+from bot.database.models import Group, GroupSettings
+from bot.services.settings_cache import settings_cache
+from bot.services.admin_cache import admin_cache
+from bot.services.outbox import outbox, PRIORITY_BACKGROUND
+from bot.services.sharding import shard
+from config import WARMUP_GROUPS, WARMUP_ACTIVE_HOURS, WARMUP_CONCURRENCY, WARMUP_REPORT_AFTER
+
+# Group ids per settings SELECT
+LOAD_CHUNK = 500
+
+def _rate(hits: int, misses: int) -> str:
+    total = hits + misses
+    return f"{hits / total:.0%} of {total}" if total else "no lookups"
+
+class WarmUp:
+    """
+    Fills the caches that the first updates after a deploy would otherwise
+    miss: the bot identity (used by /start), settings of the most recently
+    active groups (a few bulk SELECTs) and their admin lists (at most
+    `concurrency` get_chat_administrators calls at a time, through the outbox
+    at the lowest priority so the post-deploy backlog of moderation actions
+    goes first). Runs in the background, updates are processed meanwhile.
+    Each shard warms up only the chats it owns.
+    """
+
+    def __init__(
+        self,
+        max_groups: int = WARMUP_GROUPS,
+        active_hours: int = WARMUP_ACTIVE_HOURS,
+        concurrency: int = WARMUP_CONCURRENCY,
+        report_after: float = WARMUP_REPORT_AFTER
+    ):
+        self.max_groups = max_groups
+        self.active_hours = active_hours
+        self.concurrency = concurrency
+        self.report_after = report_after
+        self.elapsed: Optional[float] = None # seconds, set when done
+        self._task: Optional[asyncio.Task] = None
+
+    async def _active_groups(self) -> List[int]:
+        since = datetime.utcnow() - timedelta(hours=self.active_hours)
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(Group.id)
+                .where(Group.last_active_at >= since)
+                .order_by(Group.last_active_at.desc())
+                .limit(self.max_groups * shard.count)
+            )
+            group_ids = result.scalars().all()
+        return [group_id for group_id in group_ids if shard.owns(group_id)][:self.max_groups]
+
+    async def _load_settings(self, group_ids: List[int]) -> int:
+        loaded = 0
+        async with async_session_maker() as session:
+            for i in range(0, len(group_ids), LOAD_CHUNK):
+                result = await session.execute(
+                    select(GroupSettings).where(GroupSettings.group_id.in_(group_ids[i:i + LOAD_CHUNK]))
+                )
+                for settings in result.scalars().all():
+                    # Anything loaded by a handler meanwhile is at least as fresh
+                    if settings_cache.version(settings.group_id) is None:
+                        settings_cache.set(settings.group_id, settings)
+                        loaded += 1
+        return loaded
+
+    async def _load_admins(self, bot: Bot, group_ids: List[int]) -> int:
+        """Number of admin lists fetched by the warm-up itself"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def load(group_id: int) -> bool:
+            async with semaphore:
+                if admin_cache.loaded(group_id):
+                    # A handler got there first
+                    return False
+                try:
+                    members = await outbox.call(
+                        group_id, lambda: bot.get_chat_administrators(group_id), priority=PRIORITY_BACKGROUND
+                    )
+                except Exception as e:
+                    logging.warning(f"Warm-up: admins of {group_id} not loaded: {e}")
+                    return False
+                admin_cache.store(group_id, {m.user.id for m in members})
+                return True
+
+        return sum(await asyncio.gather(*(load(group_id) for group_id in group_ids)))
+
+    async def run(self, bot: Bot):
+        started = time.monotonic()
+        me = await bot.me() # Cached by aiogram for the lifetime of the bot object
+        group_ids = await self._active_groups()
+        settings = await self._load_settings(group_ids)
+        settings_done = time.monotonic() - started
+        admins = await self._load_admins(bot, group_ids)
+        self.elapsed = time.monotonic() - started
+        logging.info(
+            f"Warm-up done in {self.elapsed:.1f}s (@{me.username}): {len(group_ids)} active groups, "
+            f"{settings} settings in {settings_done:.1f}s, {admins} admin lists"
+        )
+
+        # How much of the following traffic the warm caches served (warm-up's own loads excluded)
+        settings_base = settings_cache.hits, settings_cache.misses
+        admins_base = admin_cache.hits, admin_cache.misses
+        await asyncio.sleep(self.report_after)
+        logging.info(
+            f"Cache hit rate {self.report_after}s after warm-up: "
+            f"settings {_rate(settings_cache.hits - settings_base[0], settings_cache.misses - settings_base[1])}, "
+            f"admins {_rate(admin_cache.hits - admins_base[0], admin_cache.misses - admins_base[1])}"
+        )
+
+    async def _run(self, bot: Bot):
+        try:
+            await self.run(bot)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Warm-up failed: {e}")
+
+    def start(self, bot: Bot):
+        if self._task is None and self.max_groups > 0:
+            self._task = asyncio.create_task(self._run(bot))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+warmup = WarmUp()
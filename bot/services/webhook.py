@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+from aiogram import Bot, Dispatcher
+from bot.services.sharding import update_chat_id
+from config import WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE
+
+class UpdateFeeder:
+    """
+    Bounded queues between update ingress and the dispatcher.
+    The route only enqueues the raw JSON and returns, a fixed pool of workers
+    parses updates and runs Dispatcher.feed_raw_update. Each worker has its
+    own queue and a chat always maps to the same worker, so updates of one
+    chat are processed in order.
+
+    In sharded mode the parent process does not run a dispatcher, forward()
+    hands every submitted update to the shard router instead.
+    """
+
+    def __init__(self, workers: int = WEBHOOK_WORKERS, max_queue: int = WEBHOOK_QUEUE_SIZE):
+        self.workers = workers
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue(maxsize=max(1, max_queue // workers)) for _ in range(workers)
+        ]
+        self._tasks: List[asyncio.Task] = []
+        self._forward: Optional[Callable[[dict], bool]] = None
+        self._bot: Optional[Bot] = None
+        self._dp: Optional[Dispatcher] = None
+        self._kwargs: Dict[str, Any] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks) or self._forward is not None
+
+    @property
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def _queue_for(self, update: dict) -> asyncio.Queue:
+        return self._queues[update_chat_id(update) % self.workers]
+
+    def submit(self, update: dict) -> bool:
+        """Enqueue a raw update. False when not running or full (caller answers 503, Telegram retries)."""
+        if self._forward is not None:
+            return self._forward(update)
+        if not self._tasks:
+            return False
+        try:
+            self._queue_for(update).put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def put(self, update: dict):
+        """Enqueue, waiting for room (used by shard workers)"""
+        await self._queue_for(update).put(update)
+
+    def forward(self, func: Optional[Callable[[dict], bool]]):
+        self._forward = func
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                await self._dp.feed_raw_update(self._bot, update, **self._kwargs)
+            except Exception as e:
+                logging.exception(f"Failed to process update {update.get('update_id')}: {e}")
+            finally:
+                queue.task_done()
+
+    def start(self, bot: Bot, dp: Dispatcher, **kwargs):
+        if self._tasks:
+            return
+        self._bot, self._dp, self._kwargs = bot, dp, kwargs
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+
+    async def stop(self, timeout: float = 10):
+        """Finish queued updates (up to `timeout` seconds) and stop the workers"""
+        tasks, self._tasks = self._tasks, []
+        if not tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Dropping {self.depth} unprocessed updates")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+update_feeder = UpdateFeeder()
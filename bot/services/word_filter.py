@@ -0,0 +1,139 @@
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+from bot.database.models import GroupSettings
+from bot.services.settings_cache import settings_cache
+
+# Uzbek (and Russian) Cyrillic -> Uzbek Latin spelling.
+# Apostrophes are dropped on both sides, so o'/o‘/oʻ/o all compare equal.
+CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'yo',
+    'ж': 'j', 'з': 'z', 'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'x', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh', 'ъ': '',
+    'ы': 'i', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+    'ў': 'o', 'қ': 'q', 'ғ': 'g', 'ҳ': 'h',
+}
+
+# Non-Latin letters and digits that *look* like Latin letters (evasion tricks)
+HOMOGLYPHS = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h',
+    'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ь': 'b',
+    'і': 'i', 'ј': 'j', 'ѕ': 's', 'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w', 'ў': 'y',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o',
+    'ρ': 'p', 'τ': 't', 'υ': 'u', 'χ': 'x',
+    # Leetspeak
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's',
+}
+
+_IGNORED = "'`´ʻʼʽ‘’\u200b\u200c\u200d\u2060\ufeff\u00ad"
+
+TRANSLIT_TABLE = str.maketrans({**CYRILLIC_TO_LATIN, **dict.fromkeys(_IGNORED, '')})
+GLYPH_TABLE = str.maketrans({**HOMOGLYPHS, **dict.fromkeys(_IGNORED, '')})
+
+def _strip_marks(text: str) -> str:
+    """Drop accents / combining marks (ć -> c)"""
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+_TOKEN_REGEX = re.compile(r'\S+')
+_LATIN_REGEX = re.compile(r'[a-z]')
+_GLYPHS = frozenset(HOMOGLYPHS)
+
+def _is_mixed(token: str) -> bool:
+    """Latin letters next to Cyrillic / Greek letters or digits in one word (саsino, c4sino)"""
+    return _LATIN_REGEX.search(token) is not None and not _GLYPHS.isdisjoint(token)
+
+def _fold_token(match: "re.Match") -> str:
+    token = match.group(0)
+    return token.translate(GLYPH_TABLE if _is_mixed(token) else TRANSLIT_TABLE)
+
+def normalize(text: str) -> Tuple[str, str]:
+    """
+    Returns the two comparable forms of `text`:
+    Uzbek Latin transliteration and homoglyph-folded skeleton.
+    Only mixed script words (саsino, c4sino) are homoglyph-folded, every other
+    word is transliterated in both forms, so plain Cyrillic (вот -> vot, not bot)
+    never matches Latin words by shape.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    latin = _strip_marks(text.translate(TRANSLIT_TABLE))
+    if _LATIN_REGEX.search(text) is None or _GLYPHS.isdisjoint(text):
+        return latin, latin
+    return latin, _strip_marks(_TOKEN_REGEX.sub(_fold_token, text))
+
+class WordMatcher:
+    """
+    All forbidden words of a group compiled into one regex.
+    Both normalized forms of the message are scanned in a single search() call.
+    """
+
+    def __init__(self, words: Iterable[str], whole_word: bool = False):
+        variants = set()
+        for word in words:
+            if not word:
+                continue
+            for form in normalize(word.strip()):
+                if form:
+                    variants.add(form)
+
+        self.whole_word = whole_word
+        self._regex = None
+        if variants:
+            # Longest first, so overlapping words report the most specific one
+            alternation = '|'.join(re.escape(v) for v in sorted(variants, key=len, reverse=True))
+            if whole_word:
+                alternation = rf'(?<!\w)(?:{alternation})(?!\w)'
+            self._regex = re.compile(alternation)
+
+    @property
+    def active(self) -> bool:
+        return self._regex is not None
+
+    def search(self, text: str) -> Optional[str]:
+        """Return the matched (normalized) word or None"""
+        if self._regex is None or not text:
+            return None
+        return self.search_normalized(*normalize(text))
+
+    def search_normalized(self, latin: str, skeleton: str) -> Optional[str]:
+        """search() for text already passed through normalize()"""
+        if self._regex is None:
+            return None
+        # \x00 is a non-word char, so it also acts as a boundary in whole-word mode
+        haystack = latin if latin == skeleton else f"{latin}\x00{skeleton}"
+        match = self._regex.search(haystack)
+        return match.group(0) if match else None
+
+_MAX_MATCHERS = 10000
+# group_id -> ((settings version, whole_word), matcher)
+_matchers: "OrderedDict[int, Tuple[tuple, WordMatcher]]" = OrderedDict()
+
+def get_matcher(settings: GroupSettings) -> Optional[WordMatcher]:
+    """Compiled matcher for the group, rebuilt only when its settings version changes"""
+    if not settings.forbidden_words:
+        return None
+
+    whole_word = bool(settings.forbidden_words_whole_word)
+    version = settings_cache.version(settings.group_id)
+    if version is None:
+        # Settings object did not come from the cache, do not keep the result
+        return WordMatcher(settings.forbidden_words, whole_word)
+
+    key = (version, whole_word)
+    entry = _matchers.get(settings.group_id)
+    if entry and entry[0] == key:
+        _matchers.move_to_end(settings.group_id)
+        return entry[1]
+
+    matcher = WordMatcher(settings.forbidden_words, whole_word)
+    _matchers[settings.group_id] = (key, matcher)
+    _matchers.move_to_end(settings.group_id)
+    while len(_matchers) > _MAX_MATCHERS:
+        _matchers.popitem(last=False)
+    return matcher
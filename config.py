@@ -1,4 +1,5 @@
 import os
+import hashlib
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,3 +15,93 @@ if DATABASE_URL:
     elif DATABASE_URL.startswith("postgresql://"):
         DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
+# Connection pool (ignored for SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30)) # seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800)) # seconds, below typical server idle timeouts
+
+# In-process GroupSettings cache
+SETTINGS_CACHE_SIZE = int(os.getenv("SETTINGS_CACHE_SIZE", 10000))
+SETTINGS_CACHE_TTL = int(os.getenv("SETTINGS_CACHE_TTL", 300)) # seconds
+
+# Serialized Mini App API responses (writes through the API invalidate them)
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", 10)) # seconds
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", 10000))
+
+# Per-chat administrator cache
+ADMIN_CACHE_TTL = int(os.getenv("ADMIN_CACHE_TTL", 600)) # seconds
+ADMIN_CACHE_SIZE = int(os.getenv("ADMIN_CACHE_SIZE", 10000))
+ADMIN_CACHE_RETRY = int(os.getenv("ADMIN_CACHE_RETRY", 30)) # seconds before a failed load is retried
+
+# User profile write-behind
+USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", 5)) # seconds
+USER_FLUSH_BATCH = int(os.getenv("USER_FLUSH_BATCH", 500))
+USER_FINGERPRINT_SIZE = int(os.getenv("USER_FINGERPRINT_SIZE", 100000))
+
+# Buffered ModerationLog writer
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", 500))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", 2)) # seconds
+
+# Flood control backend: "redis" (shared, needs REDIS_URL) or "memory" (single node)
+REDIS_URL = os.getenv("REDIS_URL")
+FLOOD_BACKEND = os.getenv("FLOOD_BACKEND", "redis" if REDIS_URL else "memory")
+FLOOD_MAX_KEYS = int(os.getenv("FLOOD_MAX_KEYS", 100000))
+
+# Duplicate (copy-paste) message detection
+DUPLICATE_WINDOW = int(os.getenv("DUPLICATE_WINDOW", 60)) # seconds
+DUPLICATE_GROUP_LIMIT = int(os.getenv("DUPLICATE_GROUP_LIMIT", 3)) # same text from anyone
+DUPLICATE_MAX_ENTRIES = int(os.getenv("DUPLICATE_MAX_ENTRIES", 256)) # per group
+DUPLICATE_MIN_LENGTH = int(os.getenv("DUPLICATE_MIN_LENGTH", 10))
+
+# Update delivery: "polling" or "webhook" (served by the FastAPI app)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", os.getenv("WEBAPP_URL", "")).rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# Stable across restarts, Telegram sends it back in X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or (hashlib.sha256(BOT_TOKEN.encode()).hexdigest() if BOT_TOKEN else "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 16))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 40))
+
+# Sharded mode: BOT_WORKERS > 1 runs that many worker processes, updates are
+# routed by chat id (the parent process does polling / webhook and the API)
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 1))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", 160)) # hash ring points per worker
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", 1000)) # updates buffered per worker
+
+# Outbound Telegram calls (Bot API limits: ~30 msg/s overall, ~20 msg/min per group)
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", 30)) # calls per second
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", 20)) # messages per minute per chat
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 16))
+# Disallowed album items are collected this long and removed with one deleteMessages call
+ALBUM_DELETE_DELAY = float(os.getenv("ALBUM_DELETE_DELAY", 1.0)) # seconds
+
+# Mass join handling
+JOIN_RESTRICT_CONCURRENCY = int(os.getenv("JOIN_RESTRICT_CONCURRENCY", 10))
+
+# Moderation log rollups and retention
+ROLLUP_INTERVAL = int(os.getenv("ROLLUP_INTERVAL", 300)) # seconds between runs
+ROLLUP_LAG = int(os.getenv("ROLLUP_LAG", 60)) # seconds, leaves in-flight inserts alone
+ROLLUP_BATCH = int(os.getenv("ROLLUP_BATCH", 10000)) # log ids per transaction
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", 90)) # 0 keeps raw logs forever
+LOG_PURGE_BATCH = int(os.getenv("LOG_PURGE_BATCH", 1000)) # rows per DELETE
+
+# Cached group member counts
+MEMBER_COUNT_TTL = int(os.getenv("MEMBER_COUNT_TTL", 6 * 3600)) # seconds before a count is refreshed
+MEMBER_COUNT_INTERVAL = int(os.getenv("MEMBER_COUNT_INTERVAL", 300)) # seconds between scans
+MEMBER_COUNT_BATCH = int(os.getenv("MEMBER_COUNT_BATCH", 200)) # groups per scan
+MEMBER_COUNT_CONCURRENCY = int(os.getenv("MEMBER_COUNT_CONCURRENCY", 5))
+
+# Startup cache warm-up for recently active groups
+ACTIVITY_FLUSH_INTERVAL = int(os.getenv("ACTIVITY_FLUSH_INTERVAL", 300)) # seconds, Group.last_active_at granularity
+WARMUP_GROUPS = int(os.getenv("WARMUP_GROUPS", 1000)) # most recently active groups, 0 disables
+WARMUP_ACTIVE_HOURS = int(os.getenv("WARMUP_ACTIVE_HOURS", 24))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", 5)) # parallel get_chat_administrators calls
+WARMUP_REPORT_AFTER = int(os.getenv("WARMUP_REPORT_AFTER", 300)) # seconds until the cache hit rate is logged
+
+# Owner broadcasts (share the outbox global rate limit)
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 8))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", 500)) # users per checkpoint
+BROADCAST_LEASE = int(os.getenv("BROADCAST_LEASE", 300)) # seconds a process owns a broadcast without checkpointing
@@ -3,6 +3,7 @@ import logging
 import sys
 import os
 import uvicorn
+from contextlib import suppress
 from bot.main import main as bot_main
 from bot.api.server import app
 
@@ -16,11 +17,17 @@ async def start_api():
     await server.serve()
 
 async def main():
-    # Run API and Bot concurrently
-    await asyncio.gather(
-        bot_main(),
-        start_api()
-    )
+    # Run API and Bot concurrently (in webhook mode the API also receives updates)
+    tasks = [asyncio.create_task(bot_main()), asyncio.create_task(start_api())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    
+    # One side stopped (e.g. uvicorn got SIGTERM) -> shut the other one down cleanly
+    for task in pending:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    for task in done:
+        task.result()
 
 if __name__ == "__main__":
     try:
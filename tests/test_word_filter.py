@@ -0,0 +1,22 @@
+import pytest
+from bot.services.word_filter import WordMatcher, normalize
+
+@pytest.mark.parametrize('whole_word', [False, True])
+@pytest.mark.parametrize('word, text', [
+    ('bet', 'Привет всем'),
+    ('bot', 'вот так'),
+    ('ham', 'нам нужно'),
+])
+def test_cyrillic_words_do_not_match_by_shape(word, text, whole_word):
+    assert WordMatcher([word], whole_word).search(text) is None
+
+def test_cyrillic_words_are_transliterated_only():
+    assert normalize('Привет всем') == ('privet vsem', 'privet vsem')
+
+@pytest.mark.parametrize('text', ['саsino', 'c4s1no', 'cаsinо bonus'])
+def test_mixed_script_words_are_folded(text):
+    assert WordMatcher(['casino']).search(text) == 'casino'
+
+@pytest.mark.parametrize('text', ['казино', 'kaзино', 'kazino'])
+def test_cyrillic_forbidden_word_matches_through_transliteration(text):
+    assert WordMatcher(['казино'], whole_word=True).search(text) == 'kazino'